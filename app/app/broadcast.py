@@ -1,29 +1,338 @@
 """
 Server Sent Events (SSE) broadcaster
 The server can manage global Svelte UI state changes to all connected clients.
+
+Subscribers name the event types they want (or take everything), and are
+indexed by type, so an event is only queued for the subscribers interested
+in it. Each event is serialized into its SSE wire frame once, and the same
+Message is shared by all of them. Every subscriber gets its own bounded
+queue, and broadcast() never waits on any of them. When a subscriber falls
+behind, an event whose type is in COALESCED_EVENT_TYPES replaces the pending
+event for the same piece of state (its STATE_KEYS key), as only the latest
+value matters. Other events are dropped oldest first, and neither logout nor
+coalesced events are ever dropped. A subscriber whose queue stays full for
+SLOW_SUBSCRIBER_TIMEOUT seconds is disconnected.
+
+Broadcast events get monotonic ids, and the last REPLAY_BUFFER_SIZE of them
+are kept so that a reconnecting client can resume from its Last-Event-ID.
+A client that is too far behind (or that predates this process) gets a
+snapshot instead: the latest event for each piece of state in STATE_KEYS.
 """
 
-from typing import Set
-from asyncio import Queue
+from typing import Callable, Dict, FrozenSet, Hashable, Iterable, List, Optional, Set
+from collections import defaultdict, deque
+import asyncio
 import logging
+import os
+import time
 from app.models.events import Event
+from app.lib.workers import MULTI_WORKER
 
 logger = logging.getLogger(__name__)
 
-subscribers: Set[Queue] = set()
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SUBSCRIBER_QUEUE_SIZE", "256"))
+SLOW_SUBSCRIBER_TIMEOUT = float(os.getenv("SLOW_SUBSCRIBER_TIMEOUT", "30"))
+REPLAY_BUFFER_SIZE = int(os.getenv("REPLAY_BUFFER_SIZE", "1024"))
+
+COALESCED_EVENT_TYPES = {"context_changed", "tmux_session_changed", "tmux_cwd_changed"}
+UNDROPPABLE_EVENT_TYPES = {"logout"}
+KEPT_EVENT_TYPES = COALESCED_EVENT_TYPES | UNDROPPABLE_EVENT_TYPES
+
+# The piece of state each stateful event type describes. A newer event with
+# the same key supersedes the older one in the snapshot:
+STATE_KEYS: Dict[str, Callable[[Event], Hashable]] = {
+    "context_changed": lambda e: e.type,
+    "context_list": lambda e: e.type,
+    "tmux_session_changed": lambda e: (e.type, e.session),
+    "tmux_cwd_changed": lambda e: (e.type, e.session),
+    "instance_status": lambda e: (e.type, e.context, e.project),
+}
+
+# Counters since startup:
+counters = {
+    "coalesced": 0,
+    "dropped": 0,
+    "slow_subscribers": 0,
+    "disconnected_subscribers": 0,
+}
+
+
+class SubscriberClosed(Exception):
+    pass
+
+
+class Message:
+    """An event together with its SSE wire frame."""
+
+    __slots__ = ("event", "type", "key", "id", "frame")
+
+    def __init__(
+        self, event: Event, id: Optional[int] = None, data: Optional[str] = None
+    ):
+        self.event = event
+        self.type = event.type
+        # The piece of state a coalesced event replaces:
+        self.key = (
+            STATE_KEYS[event.type](event)
+            if event.type in COALESCED_EVENT_TYPES
+            else None
+        )
+        self.id = id
+        id_line = f"id: {transport.epoch}-{id}\n" if id is not None else ""
+        if data is None:
+            data = event.model_dump_json()
+        self.frame = f"{id_line}event: {event.type}\ndata: {data}\n\n".encode()
+
 
+class Subscriber:
+    def __init__(
+        self,
+        types: Optional[Iterable[str]] = None,
+        maxsize: int = SUBSCRIBER_QUEUE_SIZE,
+    ):
+        # The event types to receive, or None for all of them:
+        self.types: Optional[FrozenSet[str]] = (
+            frozenset(types) if types is not None else None
+        )
+        self.maxsize = maxsize
+        self.messages: deque[Message] = deque()
+        self.closed = False
+        # When the queue last became full, or None if it isn't full:
+        self.full_since: Optional[float] = None
+        self._waiter: Optional[asyncio.Future] = None
 
-async def subscribe() -> Queue:
-    q = Queue()
+    def put(self, message: Message):
+        """Queue a message without ever blocking the caller."""
+        if self.closed:
+            return
+        if message.key is not None:
+            for pending in self.messages:
+                if pending.key == message.key:
+                    self.messages.remove(pending)
+                    counters["coalesced"] += 1
+                    break
+        if len(self.messages) >= self.maxsize and not self._make_room(message):
+            return
+        self.messages.append(message)
+        self._wake()
+
+    def _make_room(self, message: Message) -> bool:
+        now = time.monotonic()
+        if self.full_since is None:
+            self.full_since = now
+            counters["slow_subscribers"] += 1
+            logger.warning("Subscriber queue is full, dropping events")
+        elif now - self.full_since > SLOW_SUBSCRIBER_TIMEOUT:
+            logger.warning(
+                f"Subscriber queue full for over {SLOW_SUBSCRIBER_TIMEOUT}s, "
+                "disconnecting it"
+            )
+            counters["disconnected_subscribers"] += 1
+            self.close()
+            return False
+        # Coalesced events are at most one per piece of state, so keep those too:
+        for pending in self.messages:
+            if pending.type not in KEPT_EVENT_TYPES:
+                self.messages.remove(pending)
+                counters["dropped"] += 1
+                return True
+        if message.type in KEPT_EVENT_TYPES:
+            return True
+        counters["dropped"] += 1
+        return False
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Message]:
+        """
+        Wait for the next message, or return None after timeout seconds.
+        Raises SubscriberClosed once closed.
+        """
+        expired = False
+        while not self.messages:
+            if self.closed:
+                raise SubscriberClosed()
+            if expired:
+                return None
+            loop = asyncio.get_running_loop()
+            self._waiter = loop.create_future()
+            timer = (
+                loop.call_later(timeout, self._wake) if timeout is not None else None
+            )
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+                if timer is not None:
+                    timer.cancel()
+            expired = timeout is not None
+        message = self.messages.popleft()
+        if len(self.messages) < self.maxsize:
+            self.full_since = None
+        return message
+
+    def qsize(self) -> int:
+        return len(self.messages)
+
+    def close(self):
+        self.closed = True
+        self.messages.clear()
+        unsubscribe(self)
+        self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+
+# Every subscriber, and the same subscribers indexed by what they receive:
+subscribers: Set[Subscriber] = set()
+all_event_subscribers: Set[Subscriber] = set()
+topic_subscribers: Dict[str, Set[Subscriber]] = defaultdict(set)
+history: deque[Message] = deque(maxlen=REPLAY_BUFFER_SIZE)
+state: Dict[Hashable, Message] = {}
+last_id = 0
+
+
+async def subscribe(types: Optional[Iterable[str]] = None) -> Subscriber:
+    """Subscribe to the given event types, or to every event if None."""
+    q = Subscriber(types)
     subscribers.add(q)
+    if q.types is None:
+        all_event_subscribers.add(q)
+    else:
+        for event_type in q.types:
+            topic_subscribers[event_type].add(q)
     return q
 
 
-def unsubscribe(q: Queue):
+def unsubscribe(q: Subscriber):
+    if q not in subscribers:
+        return
     subscribers.discard(q)
+    if q.types is None:
+        all_event_subscribers.discard(q)
+    else:
+        for event_type in q.types:
+            topic = topic_subscribers[event_type]
+            topic.discard(q)
+            if not topic:
+                del topic_subscribers[event_type]
+
+
+def update_state(event: Event) -> Message:
+    """Record the latest value of a piece of state, without broadcasting it."""
+    message = Message(event)
+    state[STATE_KEYS[event.type](event)] = message
+    return message
+
+
+def get_state(key: Hashable) -> Optional[Event]:
+    message = state.get(key)
+    return message.event if message is not None else None
+
+
+def replay(last_event_id: str) -> Optional[List[Message]]:
+    """
+    Return the messages broadcast after last_event_id, or None if they are
+    no longer all in the replay buffer.
+    """
+    epoch, _, n = last_event_id.partition("-")
+    if epoch != transport.epoch or not n.isdigit():
+        return None
+    n = int(n)
+    if n >= last_id:
+        return []
+    if not history or history[0].id > n + 1:
+        return None
+    return [m for m in history if m.id > n]
+
+
+def snapshot() -> List[Message]:
+    """The latest message for each piece of state, oldest first."""
+    return sorted(state.values(), key=lambda m: m.id or 0)
+
+
+def resume_frame() -> bytes:
+    """An SSE frame that moves the client's Last-Event-ID up to date."""
+    return f"id: {transport.epoch}-{last_id}\n\n".encode()
+
+
+def deliver(event: Event, id: int, data: Optional[str] = None):
+    """
+    Deliver a broadcast event to this process's subscribers. Called by the
+    transport, with ids in increasing order.
+    """
+    global last_id
+    last_id = id
+    message = Message(event, id, data)
+    history.append(message)
+    if message.type in STATE_KEYS:
+        state[STATE_KEYS[message.type](event)] = message
+    interested = list(all_event_subscribers)
+    topic = topic_subscribers.get(message.type)
+    if topic:
+        interested.extend(topic)
+    logger.debug("Broadcasting %s to %d subscribers", message.type, len(interested))
+    for q in interested:
+        q.put(message)
+
+
+class LocalTransport:
+    """Delivers events within this process only."""
+
+    def __init__(self):
+        # Event ids are "<epoch>-<n>", so that ids from before a restart are
+        # never mistaken for current ones:
+        self.epoch = f"{time.time_ns():x}"
+        self.next_id = 1
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, event: Event):
+        id = self.next_id
+        self.next_id += 1
+        deliver(event, id)
+
+
+transport = LocalTransport()
+
+
+async def start_transport():
+    """
+    Switch to the SQLite event bus when running several workers, so that
+    every worker's subscribers see every event.
+    """
+    global transport
+    if MULTI_WORKER:
+        from app.lib.bus import SqliteTransport
+
+        transport = SqliteTransport()
+    await transport.start()
+
+
+async def stop_transport():
+    await transport.stop()
 
 
 async def broadcast(event: Event):
-    logger.info(f"Broadcasting to {len(subscribers)} subscribers: {event}")
-    for q in subscribers:
-        await q.put(event)
+    """
+    Send an event to every subscriber, in every worker. Events built from
+    trusted internal data can skip pydantic validation by using
+    model_construct().
+    """
+    await transport.publish(event)
+
+
+def stats() -> dict:
+    return {
+        "subscribers": len(subscribers),
+        "queued": sum(q.qsize() for q in subscribers),
+        "transport": type(transport).__name__,
+        "last_event_id": f"{transport.epoch}-{last_id}",
+        "replay_buffer": len(history),
+        "state": len(state),
+        **counters,
+    }
@@ -0,0 +1,119 @@
+"""
+SQLite event bus, for running several uvicorn workers.
+
+Every worker appends the events it broadcasts to a table in the shared
+database, and every worker (the publisher included) polls that table and
+delivers the new rows to its own subscribers. The row id is the event id,
+so Last-Event-ID resume works whichever worker a client reconnects to.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from pydantic import TypeAdapter
+
+from app import broadcast
+from app.lib.leader import leader
+from app.lib.workers import connect_shared_db_async
+from app.models.events import Event
+
+logger = logging.getLogger(__name__)
+
+BUS_POLL_INTERVAL = float(os.getenv("BUS_POLL_INTERVAL", "0.05"))
+# How many events the leader keeps in the table:
+BUS_RETENTION = int(os.getenv("BUS_RETENTION", "10000"))
+BUS_PRUNE_INTERVAL = 60
+
+event_adapter = TypeAdapter(Event)
+
+
+class SqliteTransport:
+    def __init__(self):
+        self.conn = None
+        self.epoch: Optional[str] = None
+        self.cursor = 0
+        self._tasks = []
+
+    async def start(self):
+        # The database is shared with the other workers, whose writes can
+        # keep ours waiting, so it is only used through aiosqlite's thread:
+        self.conn = await connect_shared_db_async()
+        await self.conn.executescript("""
+            create table if not exists bus_meta (
+                key text primary key,
+                value text not null
+            );
+            create table if not exists bus_event (
+                id integer primary key autoincrement,
+                type text not null,
+                data text not null
+            );
+            """)
+        # The epoch lives as long as the shared database does, so all
+        # workers agree on it:
+        await self.conn.execute(
+            "insert or ignore into bus_meta (key, value) values ('epoch', ?)",
+            (f"{time.time_ns():x}",),
+        )
+        ((self.epoch,),) = await self.conn.execute_fetchall(
+            "select value from bus_meta where key = 'epoch'"
+        )
+        ((self.cursor,),) = await self.conn.execute_fetchall(
+            "select coalesce(max(id), 0) from bus_event"
+        )
+        self._tasks = [
+            asyncio.create_task(self.poll()),
+            asyncio.create_task(self.prune()),
+        ]
+        logger.info(f"Event bus started at event {self.cursor}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.conn is not None:
+            await self.conn.close()
+
+    async def publish(self, event: Event):
+        await self.conn.execute(
+            "insert into bus_event (type, data) values (?, ?)",
+            (event.type, event.model_dump_json()),
+        )
+
+    async def receive(self):
+        rows = await self.conn.execute_fetchall(
+            "select id, data from bus_event where id > ? order by id",
+            (self.cursor,),
+        )
+        for id, data in rows:
+            self.cursor = id
+            try:
+                event = event_adapter.validate_json(data)
+            except ValueError as e:
+                logger.warning(f"Skipping unreadable bus event {id}: {e}")
+                continue
+            broadcast.deliver(event, id, data)
+
+    async def poll(self):
+        while True:
+            try:
+                await self.receive()
+            except Exception:
+                logger.exception("Event bus poll failed")
+            await asyncio.sleep(BUS_POLL_INTERVAL)
+
+    async def prune(self):
+        while True:
+            await asyncio.sleep(BUS_PRUNE_INTERVAL)
+            if not leader.is_leader:
+                continue
+            try:
+                await self.conn.execute(
+                    "delete from bus_event where id <= ?",
+                    (self.cursor - BUS_RETENTION,),
+                )
+            except Exception:
+                logger.exception("Event bus prune failed")
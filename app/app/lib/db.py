@@ -1,12 +1,38 @@
 from pathlib import Path
+import asyncio
+import contextlib
+import logging
 import os
+import time
 import aiosql
-from typing import AsyncGenerator, AsyncIterator, Optional, Callable
+from typing import (
+    AsyncContextManager,
+    AsyncGenerator,
+    AsyncIterator,
+    Optional,
+    Callable,
+)
 import aiosqlite
 
 from app.models.chat_model import ChatModel
 
+logger = logging.getLogger(__name__)
+
 DB_PATH = Path(os.getenv("HOME")) / "dry_agent" / "database" / "dry_agent.db"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+# Log a warning whenever a caller waits longer than this for a connection:
+DB_POOL_SLOW_WAIT = float(os.getenv("DB_POOL_SLOW_WAIT", "0.1"))
+
+PRAGMAS = [
+    "pragma journal_mode = WAL",
+    "pragma foreign_keys = ON",
+    "pragma synchronous = NORMAL",
+    "pragma busy_timeout = 5000",
+    # Negative cache_size is in KiB:
+    "pragma cache_size = -16000",
+    "pragma mmap_size = 67108864",
+    "pragma temp_store = MEMORY",
+]
 
 CHAT_QUERIES = aiosql.from_path(
     Path(__file__).parent.parent / "models/chat_model.sql",
@@ -14,13 +40,97 @@ CHAT_QUERIES = aiosql.from_path(
 )
 
 
-def connection_provider() -> Callable[[], aiosqlite.Connection]:
-    # Note: aiosqlite.Connection supports async context management
-    return lambda: aiosqlite.connect(DB_PATH)
+async def connect(path: Path = DB_PATH) -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(path)
+    for pragma in PRAGMAS:
+        await conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """
+    A fixed set of long-lived aiosqlite connections (each of which owns a
+    thread), handed out one caller at a time.
+    """
+
+    def __init__(self, path: Path = DB_PATH, size: int = DB_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle: Optional[asyncio.Queue] = None
+        self._connections: list[aiosqlite.Connection] = []
+        self._open_lock = asyncio.Lock()
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def open(self):
+        async with self._open_lock:
+            if self._idle is not None:
+                return
+            idle = asyncio.Queue()
+            for _ in range(self.size):
+                conn = await connect(self.path)
+                self._connections.append(conn)
+                idle.put_nowait(conn)
+            self._idle = idle
+            logger.info(f"Opened {self.size} database connections to {self.path}")
+
+    async def close(self):
+        async with self._open_lock:
+            if self._idle is None:
+                return
+            for conn in self._connections:
+                await conn.close()
+            self._connections = []
+            self._idle = None
+            logger.info(f"Closed database connections: {self.stats()}")
+
+    @contextlib.asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        if self._idle is None:
+            await self.open()
+        idle = self._idle
+        start = time.perf_counter()
+        conn = await idle.get()
+        wait = time.perf_counter() - start
+        self.acquired += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        if wait > DB_POOL_SLOW_WAIT:
+            logger.warning(f"Waited {wait * 1000:.1f}ms for a database connection")
+        try:
+            yield conn
+        finally:
+            # Don't hand an open transaction or a caller's row factory to the
+            # next caller:
+            try:
+                if conn.in_transaction:
+                    await conn.rollback()
+                conn.row_factory = None
+            finally:
+                idle.put_nowait(conn)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "acquired": self.acquired,
+            "avg_wait_ms": (
+                self.total_wait / self.acquired * 1000 if self.acquired else 0.0
+            ),
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+pool = ConnectionPool()
+
+
+def connection_provider() -> Callable[[], AsyncContextManager[aiosqlite.Connection]]:
+    return pool.connection
 
 
 async def get_chat_model() -> AsyncGenerator[ChatModel, None]:
     """
-    Yields a ChatModel backed by a fresh aiosqlite.Connection.
+    Yields a ChatModel backed by the shared connection pool.
     """
     yield ChatModel(connection_provider(), CHAT_QUERIES)
@@ -1,80 +1,206 @@
 # app/docker_context_watcher.py
+"""
+Watches the Docker CLI configuration with inotify, and broadcasts a
+ContextChangedEvent when config.json's currentContext changes, and a
+ContextListEvent when a context is created or removed.
+
+Contexts are read straight from ~/.docker/contexts/meta/<hash>/meta.json,
+the files `docker context ls` reads, rather than running the CLI.
+"""
+
 import asyncio
+import ctypes
+import ctypes.util
 import json
+import os
+import struct
 from pathlib import Path
-from watchdog.observers import Observer
-from watchdog.events import (
-    FileSystemEventHandler,
-    FileCreatedEvent,
-    FileModifiedEvent,
-    FileMovedEvent,
-)
-from app.broadcast import broadcast
-from app.models.events import ContextChangedEvent
+from typing import Dict, List
+from app.broadcast import broadcast, update_state, get_state
+from app.models.events import ContextChangedEvent, ContextListEvent
 import logging
 
-CONFIG_PATH = Path.home() / ".docker" / "config.json"
+DOCKER_DIR = Path.home() / ".docker"
+CONFIG_PATH = DOCKER_DIR / "config.json"
+CONTEXTS_META_DIR = DOCKER_DIR / "contexts" / "meta"
+
+# How long to gather file events before rereading (docker writes a few
+# files for each change):
+WATCH_DEBOUNCE = 0.1
 
 logger = logging.getLogger(__name__)
 
+# From <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# Directories whose files we read:
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MODIFY
+    | IN_CREATE
+    | IN_DELETE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_DELETE_SELF
+    | IN_ONLYDIR
+)
+# The nearest existing parent of a directory that doesn't exist yet:
+WAIT_MASK = IN_CREATE | IN_MOVED_TO | IN_ONLYDIR
+
+EVENT_HEADER = struct.Struct("iIII")
+
+_libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+
 
 def get_current_context_from_config() -> str:
     try:
         with open(CONFIG_PATH) as f:
             data = json.load(f)
             return data.get("currentContext", "default")
+    except FileNotFoundError:
+        return "default"
     except Exception as e:
         logger.warning(f"Error reading Docker config: {e}")
         return "default"
 
 
-class DockerConfigEventHandler(FileSystemEventHandler):
-    def __init__(self, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop):
-        super().__init__()
-        self.queue = queue
-        self.loop = loop
+def get_context_names_from_meta() -> List[str]:
+    """The names of the Docker contexts, except the built-in default one."""
+    names = []
+    try:
+        entries = list(CONTEXTS_META_DIR.iterdir())
+    except FileNotFoundError:
+        return []
+    for entry in entries:
+        try:
+            with open(entry / "meta.json") as f:
+                name = json.load(f).get("Name")
+        except (OSError, ValueError) as e:
+            # Possibly still being written, the next event rereads it:
+            logger.debug(f"Skipping context metadata in {entry}: {e}")
+            continue
+        if name and name != "default":
+            names.append(name)
+    return sorted(names)
+
 
-    def dispatch(self, event):
-        is_target = event.src_path == str(CONFIG_PATH) or getattr(
-            event, "dest_path", None
-        ) == str(CONFIG_PATH)
-        if is_target and isinstance(
-            event, (FileCreatedEvent, FileModifiedEvent, FileMovedEvent)
-        ):
-            logger.info(f"Detected event: {event.event_type} on {event.src_path}")
-            asyncio.run_coroutine_threadsafe(self.queue.put(event), self.loop)
+class Inotify:
+    """A minimal non-blocking inotify instance, using libc through ctypes."""
 
+    def __init__(self):
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1: {os.strerror(errno)}")
+        self.watches: Dict[Path, int] = {}
 
-async def wait_for_config_file():
-    if not CONFIG_PATH.exists():
-        logger.info("Waiting for Docker config file to appear...")
-    while not CONFIG_PATH.exists():
-        await asyncio.sleep(1)
-    logger.info("Docker config file found.")
+    def add_watch(self, path: Path, mask: int) -> bool:
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            return False
+        self.watches[path] = wd
+        return True
 
+    def rm_watch(self, path: Path):
+        wd = self.watches.pop(path, None)
+        if wd is not None:
+            _libc.inotify_rm_watch(self.fd, wd)
 
-async def monitor_docker_context():
-    await wait_for_config_file()
+    def read_events(self) -> int:
+        """Drain the pending events, and return how many there were."""
+        count = 0
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return count
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size + length
+                count += 1
+                if mask & IN_IGNORED:
+                    # The watched directory is gone:
+                    for path, watched in list(self.watches.items()):
+                        if watched == wd:
+                            del self.watches[path]
+
+    def close(self):
+        os.close(self.fd)
+
+
+def wanted_watches() -> Dict[Path, int]:
+    """
+    The directories to watch: the Docker directories that exist, each
+    context's metadata directory, and the parent of the first one that
+    doesn't exist yet, to notice when it is created.
+    """
+    wanted = {}
+    parent = DOCKER_DIR.parent
+    for path in (DOCKER_DIR, DOCKER_DIR / "contexts", CONTEXTS_META_DIR):
+        if not path.is_dir():
+            wanted.setdefault(parent, WAIT_MASK)
+            return wanted
+        wanted[path] = WATCH_MASK
+        parent = path
+    for entry in CONTEXTS_META_DIR.iterdir():
+        if entry.is_dir():
+            wanted[entry] = WATCH_MASK
+    return wanted
 
-    queue = asyncio.Queue()
-    last_context = get_current_context_from_config()
 
-    loop = asyncio.get_event_loop()
-    event_handler = DockerConfigEventHandler(queue, loop)
-    observer = Observer()
-    observer.schedule(event_handler, str(CONFIG_PATH.parent), recursive=False)
-    observer.start()
+def sync_watches(inotify: Inotify):
+    wanted = wanted_watches()
+    for path in set(inotify.watches) - set(wanted):
+        inotify.rm_watch(path)
+    for path, mask in wanted.items():
+        if path not in inotify.watches:
+            inotify.add_watch(path, mask)
+
+
+async def publish_changes():
+    current_context = get_current_context_from_config()
+    state = get_state("context_changed")
+    if state is None or state.new_context != current_context:
+        logger.info(f"Current context: {current_context}")
+        await broadcast(ContextChangedEvent(new_context=current_context))
+    contexts = get_context_names_from_meta()
+    state = get_state("context_list")
+    if state is None or state.contexts != contexts:
+        logger.info(f"Contexts: {contexts}")
+        await broadcast(ContextListEvent(contexts=contexts))
+
+
+async def monitor_docker_context():
+    inotify = Inotify()
+    sync_watches(inotify)
+    update_state(ContextChangedEvent(new_context=get_current_context_from_config()))
+    update_state(ContextListEvent(contexts=get_context_names_from_meta()))
 
-    logger.info(f"Started docker context watcher on: {CONFIG_PATH}")
-    logger.info(f"Last context: {last_context}")
+    loop = asyncio.get_running_loop()
+    readable = asyncio.Event()
+    loop.add_reader(inotify.fd, readable.set)
+    logger.info(f"Started docker context watcher on: {DOCKER_DIR}")
     try:
         while True:
-            _ = await queue.get()
-            current_context = get_current_context_from_config()
-            logger.info(f"Current context: {current_context}")
-            if current_context != last_context:
-                last_context = current_context
-                await broadcast(ContextChangedEvent(new_context=current_context))
+            await readable.wait()
+            await asyncio.sleep(WATCH_DEBOUNCE)
+            readable.clear()
+            if not inotify.read_events():
+                continue
+            # Directories may have come or gone:
+            sync_watches(inotify)
+            await publish_changes()
     finally:
-        observer.stop()
-        observer.join()
+        loop.remove_reader(inotify.fd)
+        inotify.close()
@@ -0,0 +1,157 @@
+"""
+Asyncio subprocess executor with bounded concurrency.
+
+Every external command (docker, git, ssh, d.rymcg.tech) runs through here so
+that a slow remote Docker host can never block the event loop. Concurrency is
+bounded globally, and again per Docker context, so that one unreachable SSH
+host cannot starve commands aimed at the other contexts.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_COMMANDS = int(os.getenv("MAX_CONCURRENT_COMMANDS", "16"))
+MAX_CONCURRENT_COMMANDS_PER_CONTEXT = int(
+    os.getenv("MAX_CONCURRENT_COMMANDS_PER_CONTEXT", "4")
+)
+
+# Programs that talk to a Docker daemon, and therefore count against a
+# per-context limit:
+DOCKER_PROGRAMS = {"docker", "d.rymcg.tech"}
+
+# Context key used for Docker commands that don't name a context explicitly:
+CURRENT_CONTEXT = ""
+
+
+class CommandError(Exception):
+    def __init__(self, cmd: List[str], message: str):
+        super().__init__(message)
+        self.cmd = cmd
+
+
+class CommandTimeout(CommandError):
+    def __init__(self, cmd: List[str], timeout: float):
+        super().__init__(
+            cmd, f"Command '{' '.join(cmd)}' timed out after {timeout} seconds."
+        )
+        self.timeout = timeout
+
+
+class CommandFailed(CommandError):
+    def __init__(self, cmd: List[str], returncode: int, stdout: str, stderr: str):
+        super().__init__(
+            cmd, f"Command '{' '.join(cmd)}' failed ({returncode}): {stderr.strip()}"
+        )
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+@dataclass
+class CommandResult:
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+def command_context(cmd: List[str]) -> Optional[str]:
+    """
+    Return the Docker context a command talks to, or None if the command
+    does not talk to Docker at all.
+    """
+    if not cmd or os.path.basename(cmd[0]) not in DOCKER_PROGRAMS:
+        return None
+    for i, arg in enumerate(cmd[:-1]):
+        if arg == "--context":
+            return cmd[i + 1]
+    for arg in cmd:
+        if arg.startswith("--context="):
+            return arg.split("=", 1)[1]
+    return CURRENT_CONTEXT
+
+
+async def kill_process_group(proc: asyncio.subprocess.Process):
+    """Kill the whole process group, so that ssh children die too."""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    await proc.wait()
+
+
+class CommandExecutor:
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_COMMANDS,
+        max_per_context: int = MAX_CONCURRENT_COMMANDS_PER_CONTEXT,
+    ):
+        self.max_per_context = max_per_context
+        self._global = asyncio.Semaphore(max_concurrent)
+        self._contexts: Dict[str, asyncio.Semaphore] = {}
+
+    def _context_semaphore(self, context: str) -> asyncio.Semaphore:
+        sem = self._contexts.get(context)
+        if sem is None:
+            sem = self._contexts[context] = asyncio.Semaphore(self.max_per_context)
+        return sem
+
+    async def run(
+        self,
+        cmd: List[str],
+        timeout: Optional[float] = None,
+        check: bool = True,
+        context: Optional[str] = None,
+    ) -> CommandResult:
+        """
+        Run a command and collect its output.
+
+        The timeout covers only the time the process is running, not the time
+        spent waiting for a free slot. On timeout or cancellation the process
+        group is killed. If check is True, a non-zero exit raises
+        CommandFailed.
+        """
+        if context is None:
+            context = command_context(cmd)
+        if context is None:
+            return await self._run(cmd, timeout, check)
+        async with self._context_semaphore(context):
+            return await self._run(cmd, timeout, check)
+
+    async def _run(
+        self, cmd: List[str], timeout: Optional[float], check: bool
+    ) -> CommandResult:
+        async with self._global:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True,
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+            except asyncio.TimeoutError:
+                await kill_process_group(proc)
+                raise CommandTimeout(cmd, timeout)
+            except asyncio.CancelledError:
+                logger.debug(f"Command cancelled, killing: {cmd}")
+                await kill_process_group(proc)
+                raise
+
+        result = CommandResult(
+            returncode=proc.returncode,
+            stdout=stdout.decode(errors="replace"),
+            stderr=stderr.decode(errors="replace"),
+        )
+        if check and result.returncode != 0:
+            raise CommandFailed(cmd, result.returncode, result.stdout, result.stderr)
+        return result
+
+
+executor = CommandExecutor()
@@ -0,0 +1,312 @@
+"""
+Instance status cache driven by Docker events.
+
+Each Docker context gets one background watcher, started on first use. The
+watcher takes a full container snapshot whenever it (re)connects, then
+follows `docker events` over the context's own transport (SSH for remote
+contexts) from just before the snapshot started, and keeps an in-memory
+container table current from the event stream.
+Readers get compose project state from memory, and every project status
+change is broadcast as an InstanceStatusEvent.
+
+Every worker keeps watchers for the contexts it serves, but only the leader
+broadcasts, and it follows every known context so that no change is missed.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from app.broadcast import broadcast, subscribe, unsubscribe, get_state
+from app.lib.executor import executor, kill_process_group
+from app.lib.leader import leader
+from app.models.events import InstanceStatusEvent
+
+logger = logging.getLogger(__name__)
+
+COMPOSE_PROJECT_LABEL = "com.docker.compose.project"
+COMPOSE_SERVICE_LABEL = "com.docker.compose.service"
+COMPOSE_CONFIG_FILES_LABEL = "com.docker.compose.project.config_files"
+
+CONTAINER_SNAPSHOT_FORMAT = "\t".join(
+    [
+        "{{.ID}}",
+        f'{{{{.Label "{COMPOSE_PROJECT_LABEL}"}}}}',
+        f'{{{{.Label "{COMPOSE_SERVICE_LABEL}"}}}}',
+        "{{.State}}",
+        f'{{{{.Label "{COMPOSE_CONFIG_FILES_LABEL}"}}}}',
+    ]
+)
+
+# Container state after each docker event action. Actions not listed here
+# (kill, oom, exec_*, health_status, ...) don't change the state by themselves.
+EVENT_STATES = {
+    "create": "created",
+    "start": "running",
+    "restart": "running",
+    "unpause": "running",
+    "pause": "paused",
+    "die": "exited",
+    "stop": "exited",
+}
+
+# How long a reader waits for a new watcher's first snapshot:
+READY_TIMEOUT = 30
+RETRY_DELAY_MIN = 1
+RETRY_DELAY_MAX = 60
+# The event stream starts this many seconds before the snapshot, to allow for
+# the daemon's clock being behind ours. Replaying an event is harmless:
+EVENTS_SINCE_MARGIN = 1
+
+
+def determine_project_status(container_list: list[dict]) -> str:
+    """
+    Determines the status of a project by inspecting the 'State' of containers,
+    ignoring those with Service == 'config'.
+
+    Parameters:
+    - container_list: a list of container JSON objects (already parsed from JSON)
+
+    Returns:
+    - The uniform 'State' if all non-config services share it,
+      'error' if states differ,
+      or 'unknown' if no applicable services exist.
+    """
+    states = {c["State"] for c in container_list if c.get("Service") != "config"}
+
+    if not states:
+        return "unknown"
+    if len(states) == 1:
+        return states.pop()
+    return "error"
+
+
+class WatcherError(Exception):
+    pass
+
+
+class ContextWatcher:
+    def __init__(self, context: str):
+        self.context = context
+        # container id -> {"Project", "Service", "State", "ConfigFiles"}
+        self.containers: Dict[str, dict] = {}
+        # project -> last broadcast status
+        self.status: Dict[str, str] = {}
+        self.loaded = False
+        self.ready = asyncio.Event()
+        # Set once the first connection attempt has either succeeded or failed:
+        self.settled = asyncio.Event()
+        self.last_error: Optional[Exception] = None
+        self.task = asyncio.create_task(self.run())
+
+    def projects(self) -> Dict[str, List[dict]]:
+        projects = defaultdict(list)
+        for container in self.containers.values():
+            projects[container["Project"]].append(container)
+        return projects
+
+    async def wait_ready(self):
+        if self.ready.is_set():
+            return
+        try:
+            await asyncio.wait_for(self.settled.wait(), READY_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise WatcherError(f"Timed out waiting for Docker context {self.context}")
+        if not self.ready.is_set():
+            raise WatcherError(
+                f"Docker context {self.context} is unavailable: {self.last_error}"
+            )
+
+    async def run(self):
+        delay = RETRY_DELAY_MIN
+        while True:
+            try:
+                await self.follow()
+                error = WatcherError("docker events stream ended")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+            if self.ready.is_set():
+                delay = RETRY_DELAY_MIN
+            self.ready.clear()
+            self.last_error = error
+            self.settled.set()
+            logger.warning(
+                f"Docker events watcher for {self.context} stopped ({error}), "
+                f"retrying in {delay}s"
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RETRY_DELAY_MAX)
+
+    async def follow(self):
+        # Starting `docker events` doesn't mean the daemon is streaming to it
+        # yet, so rather than subscribing first, have the daemon replay what
+        # happened while the snapshot was being taken:
+        since = int(time.time()) - EVENTS_SINCE_MARGIN
+        await self.load_snapshot()
+        proc = await asyncio.create_subprocess_exec(
+            "docker",
+            "--context",
+            self.context,
+            "events",
+            "--since",
+            str(since),
+            "--filter",
+            "type=container",
+            "--filter",
+            f"label={COMPOSE_PROJECT_LABEL}",
+            "--format",
+            "{{json .}}",
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        try:
+            self.last_error = None
+            self.ready.set()
+            self.settled.set()
+            logger.info(f"Following docker events for context: {self.context}")
+            while line := await proc.stdout.readline():
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                await self.apply_event(event)
+        finally:
+            if proc.returncode is None:
+                await kill_process_group(proc)
+
+    async def load_snapshot(self):
+        result = await executor.run(
+            [
+                "docker",
+                "--context",
+                self.context,
+                "ps",
+                "--all",
+                "--no-trunc",
+                "--filter",
+                f"label={COMPOSE_PROJECT_LABEL}",
+                "--format",
+                CONTAINER_SNAPSHOT_FORMAT,
+            ]
+        )
+        containers = {}
+        for line in result.stdout.splitlines():
+            try:
+                container_id, project, service, state, config_files = line.split("\t")
+            except ValueError:
+                continue
+            containers[container_id] = {
+                "Project": project,
+                "Service": service,
+                "State": state,
+                "ConfigFiles": config_files,
+            }
+        self.containers = containers
+        await self.update_status(
+            set(self.status) | {c["Project"] for c in containers.values()},
+            announce=self.loaded,
+        )
+        self.loaded = True
+
+    async def apply_event(self, event: dict):
+        action = event.get("Action", "").split(":", 1)[0]
+        actor = event.get("Actor", {})
+        container_id = actor.get("ID")
+        attributes = actor.get("Attributes", {})
+        project = attributes.get(COMPOSE_PROJECT_LABEL)
+        if not container_id or not project:
+            return
+        if action == "destroy":
+            if self.containers.pop(container_id, None) is None:
+                return
+        elif action in EVENT_STATES:
+            self.containers[container_id] = {
+                "Project": project,
+                "Service": attributes.get(COMPOSE_SERVICE_LABEL, ""),
+                "State": EVENT_STATES[action],
+                "ConfigFiles": attributes.get(COMPOSE_CONFIG_FILES_LABEL, ""),
+            }
+        else:
+            return
+
+        await self.update_status([project])
+
+    async def update_status(self, projects: Iterable[str], announce: bool = True):
+        """Record, and broadcast, the status of any of the given projects that changed."""
+        current = self.projects()
+        for project in projects:
+            containers = current.get(project)
+            status = (
+                determine_project_status(containers) if containers else "uninstalled"
+            )
+            if self.status.get(project, "uninstalled") == status:
+                continue
+            if containers:
+                self.status[project] = status
+            else:
+                self.status.pop(project, None)
+            if announce and leader.is_leader:
+                await broadcast(
+                    InstanceStatusEvent.model_construct(
+                        context=self.context, project=project, status=status
+                    )
+                )
+
+    def stop(self):
+        self.task.cancel()
+
+
+watchers: Dict[str, ContextWatcher] = {}
+
+
+def get_watcher(context: str) -> ContextWatcher:
+    watcher = watchers.get(context)
+    if watcher is None:
+        watcher = watchers[context] = ContextWatcher(context)
+    return watcher
+
+
+async def get_context_projects(context: str) -> Dict[str, List[dict]]:
+    """
+    Return the containers of every compose project on a Docker context,
+    grouped by project name. Served from memory once the context's watcher
+    is connected.
+    """
+    watcher = get_watcher(context)
+    await watcher.wait_ready()
+    return watcher.projects()
+
+
+def forget_context(context: str):
+    """Stop watching a Docker context that no longer exists."""
+    watcher = watchers.pop(context, None)
+    if watcher is not None:
+        watcher.stop()
+
+
+async def follow_all_contexts():
+    """
+    Keep a watcher running for every Docker context, so that the leader
+    broadcasts status changes for all of them, whichever worker serves the
+    readers.
+    """
+    queue = await subscribe(["context_list", "context_changed"])
+    try:
+        while True:
+            context_list = get_state("context_list")
+            current = get_state("context_changed")
+            contexts = set(context_list.contexts) if context_list else set()
+            if current is not None:
+                contexts.add(current.new_context)
+            for context in contexts:
+                get_watcher(context)
+            await queue.get()
+    finally:
+        unsubscribe(queue)
@@ -0,0 +1,56 @@
+"""
+Leader election between uvicorn workers.
+
+Background tasks that must only run once per container (file watchers, the
+tmux event socket, the xdg-open pipe) are started by the worker holding an
+exclusive flock on LEADER_LOCK_PATH. The kernel releases the lock when that
+worker exits, and another worker picks it up on its next retry.
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+from typing import Awaitable, Callable
+
+from app.lib.workers import RUN_PATH
+
+logger = logging.getLogger(__name__)
+
+LEADER_LOCK_PATH = RUN_PATH / "leader.lock"
+LEADER_RETRY_INTERVAL = 5
+
+
+class LeaderLock:
+    def __init__(self, path=LEADER_LOCK_PATH):
+        self.path = path
+        self._fd = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    async def run_when_leader(self, start: Callable[[], Awaitable[None]]):
+        """Wait until this worker holds the lock, then run start()."""
+        while not self.try_acquire():
+            await asyncio.sleep(LEADER_RETRY_INTERVAL)
+        logger.info(f"Worker {os.getpid()} is the leader")
+        await start()
+
+
+leader = LeaderLock()
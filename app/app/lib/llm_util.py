@@ -63,19 +63,19 @@ appropriate function (`set_default_context` or `control_docker_project`).
 
 async def get_docker_state_func() -> dict:
     # current context
-    ctx = get_docker_context()
+    ctx = await get_docker_context()
     # all contexts
-    all_ctx = get_docker_context_names()
+    all_ctx = await get_docker_context_names()
     # root domain (if configured)
     try:
-        root_cfg = get_root_config(ctx)
+        root_cfg = await get_root_config(ctx)
         root_domain = root_cfg.get("ROOT_DOMAIN", None)
     except ConfigError:
         root_domain = None
 
     # available projects & installed instances
     projects = await get_available_projects()
-    instances = get_instances(include_status=True)
+    instances = await get_instances(include_status=True)
 
     return {
         "docker_context": ctx,
@@ -83,7 +83,7 @@ async def get_docker_state_func() -> dict:
         "contexts": all_ctx,
         "projects": [p["name"] for p in projects],
         "instances": sorted(
-            [inst.instance for inst in instances.values()],
+            [inst.instance for inst in instances],
             key=lambda i: (i != "default", i),
         ),
     }
@@ -97,7 +97,7 @@ async def get_system_config(current_working_directory: Optional[str]) -> SystemC
             raise ValueError(
                 f"Invalid current working directory: {current_working_directory}"
             )
-    all_contexts = get_docker_context_names()
+    all_contexts = await get_docker_context_names()
     available_projects = await get_available_projects()
 
     # Gather known project and instance names
@@ -3,6 +3,87 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 from fastapi import Request
+from limits.storage import Storage
+from pathlib import Path
+import os
+import sqlite3
+import threading
+import time
+from app.lib.workers import MULTI_WORKER, SHARED_DB_PATH, connect_shared_db
+
+# slowapi checks limits synchronously, on the event loop, so a write that
+# has to wait for another worker gives up after this many milliseconds (and
+# the limiter falls back to counting in memory) rather than stall the loop:
+RATE_LIMIT_BUSY_TIMEOUT = int(os.getenv("RATE_LIMIT_BUSY_TIMEOUT", "50"))
+
+
+class SqliteStorage(Storage):
+    """
+    Fixed window rate limit counters in the shared SQLite database, so that
+    every worker counts against the same limits. Use as sqlite:///<path>.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        path = uri.split("://", 1)[1] or str(SHARED_DB_PATH)
+        self.conn = connect_shared_db(Path(path), busy_timeout=RATE_LIMIT_BUSY_TIMEOUT)
+        self.lock = threading.Lock()
+        self.conn.execute(
+            "create table if not exists rate_limit ("
+            "key text primary key, count integer not null, expiry real not null)"
+        )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        with self.lock:
+            (count,) = self.conn.execute(
+                "insert into rate_limit (key, count, expiry) values (?, ?, ?) "
+                "on conflict (key) do update set "
+                "count = case when expiry <= ? then excluded.count "
+                "else count + excluded.count end, "
+                "expiry = case when expiry <= ? then excluded.expiry "
+                "else expiry end "
+                "returning count",
+                (key, amount, now + expiry, now, now),
+            ).fetchone()
+        return count
+
+    def get(self, key: str) -> int:
+        with self.lock:
+            row = self.conn.execute(
+                "select count from rate_limit where key = ? and expiry > ?",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        with self.lock:
+            row = self.conn.execute(
+                "select expiry from rate_limit where key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self) -> bool:
+        try:
+            with self.lock:
+                self.conn.execute("select 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        with self.lock:
+            return self.conn.execute("delete from rate_limit").rowcount
+
+    def clear(self, key: str) -> None:
+        with self.lock:
+            self.conn.execute("delete from rate_limit where key = ?", (key,))
 
 
 def get_forwarded_ip(request: Request) -> str:
@@ -13,4 +94,8 @@ def get_forwarded_ip(request: Request) -> str:
     return request.client.host  # fallback
 
 
-limiter = Limiter(key_func=get_forwarded_ip)
+limiter = Limiter(
+    key_func=get_forwarded_ip,
+    storage_uri=f"sqlite://{SHARED_DB_PATH}" if MULTI_WORKER else "memory://",
+    in_memory_fallback_enabled=MULTI_WORKER,
+)
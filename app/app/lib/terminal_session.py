@@ -0,0 +1,511 @@
+"""
+A command running on a pseudo-terminal, with non-blocking I/O.
+
+The master side of the PTY is non-blocking and driven by the event loop:
+reads wait on loop.add_reader() and take whatever is available (up to
+PTY_READ_SIZE bytes) in one go, and writes are queued and flushed with
+loop.add_writer() whenever the PTY can't take them right away. Neither ever
+blocks the event loop, and an idle terminal costs nothing.
+
+read_batch() coalesces streaming output, so that a command spewing logs is
+sent in a few large websocket frames rather than thousands of tiny ones,
+while a lone keystroke echo still goes out immediately.
+
+OutputWindow provides acknowledgement based flow control: once a client
+has more than TERMINAL_FLOW_WINDOW bytes of output it hasn't acknowledged,
+the PTY isn't read until it catches up, and the kernel blocks the command
+on its next write.
+
+Sessions outlive their websocket. Each one keeps its last TERMINAL_SCROLLBACK
+bytes of output in a ring buffer, and a client that reconnects within
+TERMINAL_GRACE_PERIOD seconds reattaches to the still running command and
+gets the buffer replayed. Sessions nobody reattaches to are killed.
+
+A session has at most one owner, whose input goes to the command, and any
+number of read-only viewers. Each batch of output is encoded once per kind
+of client and the same frame is sent to all of them.
+"""
+
+import abc
+import asyncio
+import errno
+import fcntl
+import logging
+import os
+import pty
+import secrets
+import signal
+import struct
+import termios
+from typing import Awaitable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+PTY_READ_SIZE = int(os.getenv("PTY_READ_SIZE", "65536"))
+# Streaming output is coalesced into batches of up to this many bytes, or
+# this many seconds, whichever comes first:
+PTY_BATCH_SIZE = int(os.getenv("PTY_BATCH_SIZE", "65536"))
+PTY_BATCH_DELAY = float(os.getenv("PTY_BATCH_DELAY", "0.016"))
+# Less output than this is sent as soon as no more is pending, so that
+# interactive echo isn't delayed:
+PTY_BATCH_MIN = int(os.getenv("PTY_BATCH_MIN", "1024"))
+TERMINAL_FLOW_WINDOW = int(os.getenv("TERMINAL_FLOW_WINDOW", "1048576"))
+# Cap on output sent to a client, in bytes per second (0 for no limit):
+TERMINAL_OUTPUT_RATE = int(os.getenv("TERMINAL_OUTPUT_RATE", "0"))
+TERMINAL_SCROLLBACK = int(os.getenv("TERMINAL_SCROLLBACK", "262144"))
+TERMINAL_GRACE_PERIOD = float(os.getenv("TERMINAL_GRACE_PERIOD", "60"))
+# A viewer that takes longer than this to accept a frame is disconnected,
+# rather than holding up the owner:
+TERMINAL_VIEWER_TIMEOUT = float(os.getenv("TERMINAL_VIEWER_TIMEOUT", "10"))
+
+TERMINAL_ENV = {
+    "TERM": "xterm-256color",
+    "PATH": "/usr/bin:/bin",
+}
+
+
+class RingBuffer:
+    """The last `size` bytes written to it."""
+
+    def __init__(self, size: int = TERMINAL_SCROLLBACK):
+        self.size = size
+        self._buffer = bytearray(size)
+        self._end = 0
+        self._full = False
+
+    def write(self, data: bytes):
+        if len(data) >= self.size:
+            self._buffer[:] = data[-self.size :]
+            self._end = 0
+            self._full = True
+            return
+        first = min(len(data), self.size - self._end)
+        self._buffer[self._end : self._end + first] = data[:first]
+        rest = len(data) - first
+        self._buffer[:rest] = data[first:]
+        if rest or self._end + first == self.size:
+            self._full = True
+        self._end = (self._end + len(data)) % self.size
+
+    def getvalue(self) -> bytes:
+        if not self._full:
+            return bytes(self._buffer[: self._end])
+        data = self._buffer[self._end :] + self._buffer[: self._end]
+        # Start on a line boundary, rather than half way through an escape
+        # sequence or a multibyte character:
+        newline = data.find(b"\n")
+        return bytes(data[newline + 1 :] if newline >= 0 else data)
+
+
+class TerminalClient(abc.ABC):
+    """
+    Where a session sends its output. `window` is the client's OutputWindow,
+    or None if it doesn't do flow control. Clients with the same `encoding`
+    share the frames encode_output() makes; None means that the client's
+    frames can't be shared.
+    """
+
+    window: Optional["OutputWindow"] = None
+    encoding: Optional[str] = None
+    read_only: bool = False
+
+    @abc.abstractmethod
+    def encode_output(self, data: bytes): ...
+
+    @abc.abstractmethod
+    async def send_frame(self, frame, size: int):
+        """Send a frame from encode_output(), of `size` bytes of output."""
+
+    @abc.abstractmethod
+    async def send_replay(self, data: bytes):
+        """Send the scrollback, when the client (re)attaches."""
+
+    @abc.abstractmethod
+    async def send_exit(self, exit_code: int): ...
+
+    @abc.abstractmethod
+    async def send_read_only(self, session_id: str):
+        """Tell the owner that another client took over, and its input is ignored."""
+
+    @abc.abstractmethod
+    async def close(self): ...
+
+
+class TerminalSession:
+    def __init__(self, command: str):
+        self.id = secrets.token_urlsafe(16)
+        self.command = command
+        self.pid: Optional[int] = None
+        self.master_fd: Optional[int] = None
+        self.slave_fd: Optional[int] = None
+        self.exit_code: Optional[int] = None
+        self._pending = bytearray()
+        self._writing = False
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.scrollback = RingBuffer()
+        self.owner: Optional[TerminalClient] = None
+        self.clients: Set[TerminalClient] = set()
+        # Set once the command has exited and all of its output is read:
+        self.finished = asyncio.Event()
+        # Keeps replay and live output to a client in order:
+        self._send_lock = asyncio.Lock()
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        """Spawn the command, and read its output until it exits."""
+        self.spawn()
+        pump = asyncio.create_task(self._pump())
+        self._tasks = [pump, asyncio.create_task(self._supervise(pump))]
+
+    def spawn(self):
+        """Fork `bash -i -c command` on a new PTY."""
+        self.master_fd, self.slave_fd = pty.openpty()
+        self.pid = os.fork()
+        if self.pid == 0:
+            os.setsid()
+            os.dup2(self.slave_fd, 0)
+            os.dup2(self.slave_fd, 1)
+            os.dup2(self.slave_fd, 2)
+            os.close(self.slave_fd)
+            env = {**TERMINAL_ENV, "HOME": os.environ.get("HOME", "/tmp")}
+            os.execvpe("/bin/bash", ["bash", "-i", "-c", self.command], env)
+        os.set_blocking(self.master_fd, False)
+
+    async def wait(self) -> int:
+        """Wait for the command to exit, and return its exit code."""
+        _, status = await asyncio.to_thread(os.waitpid, self.pid, 0)
+        self.exit_code = os.WEXITSTATUS(status)
+        # With the slave side closed, reads drain what's left and then hit EOF:
+        try:
+            os.close(self.slave_fd)
+        except OSError:
+            pass
+        return self.exit_code
+
+    def read_nowait(self) -> Optional[bytes]:
+        """
+        Return the output available right now, None if there is none, or
+        b"" once the PTY is closed.
+        """
+        if self.master_fd is None:
+            return b""
+        try:
+            data = os.read(self.master_fd, PTY_READ_SIZE)
+            self.bytes_read += len(data)
+            return data
+        except BlockingIOError:
+            return None
+        except OSError as e:
+            # Linux reports EIO once the slave side is gone:
+            if e.errno == errno.EIO:
+                return b""
+            raise
+
+    async def read(self) -> bytes:
+        """
+        Wait for output and return all of it that's available, up to
+        PTY_READ_SIZE bytes. Returns b"" once the PTY is closed.
+        """
+        loop = asyncio.get_running_loop()
+        while self.master_fd is not None:
+            data = self.read_nowait()
+            if data is not None:
+                return data
+            readable = loop.create_future()
+            loop.add_reader(self.master_fd, _set_done, readable)
+            try:
+                await readable
+            finally:
+                if self.master_fd is not None:
+                    loop.remove_reader(self.master_fd)
+        return b""
+
+    async def read_batch(
+        self, max_bytes: int = PTY_BATCH_SIZE, max_delay: float = PTY_BATCH_DELAY
+    ) -> bytes:
+        """
+        Wait for output, then keep collecting it while it is still streaming
+        in, for up to max_delay seconds or max_bytes bytes. Returns b"" once
+        the PTY is closed.
+        """
+        data = await self.read()
+        if not data:
+            return data
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_delay
+        batch = bytearray(data)
+        while len(batch) < max_bytes:
+            more = self.read_nowait()
+            if more is None:
+                remaining = deadline - loop.time()
+                if len(batch) < PTY_BATCH_MIN or remaining <= 0:
+                    break
+                try:
+                    more = await asyncio.wait_for(self.read(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if not more:
+                # Closed: the next read returns b"" again.
+                break
+            batch += more
+        return bytes(batch)
+
+    async def _pump(self):
+        while True:
+            owner = self.owner
+            if owner is not None and owner.window is not None:
+                # Until the owner catches up, leave the output in the PTY, so
+                # that the command blocks. Viewers don't hold the command up.
+                await owner.window.wait()
+            data = await self.read_batch()
+            if not data:
+                break
+            async with self._send_lock:
+                self.scrollback.write(data)
+                await self._fan_out(data)
+            if TERMINAL_OUTPUT_RATE:
+                await asyncio.sleep(len(data) / TERMINAL_OUTPUT_RATE)
+
+    async def _fan_out(self, data: bytes):
+        frames = {}
+        sends = []
+        for client in self.clients:
+            frame = frames.get(client.encoding) if client.encoding else None
+            if frame is None:
+                frame = client.encode_output(data)
+                if client.encoding:
+                    frames[client.encoding] = frame
+            send = client.send_frame(frame, len(data))
+            if client.read_only:
+                send = self._send_to_viewer(client, send)
+            sends.append(send)
+        for result in await asyncio.gather(*sends, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.debug(f"Terminal client send failed: {result}")
+
+    async def _send_to_viewer(self, client: TerminalClient, send: Awaitable):
+        try:
+            await asyncio.wait_for(send, TERMINAL_VIEWER_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Disconnecting slow terminal viewer")
+            self.detach(client)
+            await client.close()
+
+    async def _supervise(self, pump: asyncio.Task):
+        exit_code = await self.wait()
+        logger.info(f"Terminal command exited with code: {exit_code}")
+        # Wait for the PTY reader to finish draining:
+        await asyncio.gather(pump, return_exceptions=True)
+        async with self._send_lock:
+            self.finished.set()
+            await asyncio.gather(
+                *(client.send_exit(exit_code) for client in self.clients),
+                return_exceptions=True,
+            )
+
+    async def attach(self, client: TerminalClient):
+        """
+        Add a client, starting it off with the scrollback. Unless it is read
+        only, it becomes the owner, and any previous owner becomes a viewer
+        and is told so.
+        """
+        demoted = None
+        async with self._send_lock:
+            replay = self.scrollback.getvalue()
+            if replay:
+                await client.send_replay(replay)
+            self.clients.add(client)
+            if not client.read_only:
+                if self.owner is not None:
+                    demoted = self.owner
+                    self._release(demoted)
+                    demoted.read_only = True
+                self.owner = client
+            if self.finished.is_set():
+                await client.send_exit(self.exit_code)
+        if demoted is not None:
+            try:
+                await self._send_to_viewer(demoted, demoted.send_read_only(self.id))
+            except Exception as e:
+                logger.debug(f"Terminal client send failed: {e}")
+
+    def detach(self, client: TerminalClient):
+        self.clients.discard(client)
+        if self.owner is client:
+            self.owner = None
+            self._release(client)
+
+    def _release(self, client: TerminalClient):
+        if client.window is not None:
+            # Don't leave the reader waiting for acks that won't matter:
+            client.window.ack(client.window.sent)
+
+    def write(self, data: bytes):
+        """Queue input for the command, without blocking."""
+        if not data or self.master_fd is None:
+            return
+        self._pending.extend(data)
+        if not self._writing:
+            self._flush()
+
+    def _flush(self):
+        try:
+            while self._pending:
+                written = os.write(self.master_fd, self._pending)
+                del self._pending[:written]
+                self.bytes_written += written
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            logger.warning(f"Discarding terminal input: {e}")
+            self._pending.clear()
+        loop = asyncio.get_running_loop()
+        if self._pending and not self._writing:
+            loop.add_writer(self.master_fd, self._flush)
+            self._writing = True
+        elif not self._pending and self._writing:
+            loop.remove_writer(self.master_fd)
+            self._writing = False
+
+    def resize(self, rows: int, cols: int):
+        if self.master_fd is None:
+            return
+        size = struct.pack("HHHH", rows, cols, 0, 0)
+        fcntl.ioctl(self.master_fd, termios.TIOCSWINSZ, size)
+
+    async def close(self):
+        """Kill the command's process group and close the PTY."""
+        try:
+            os.killpg(self.pid, signal.SIGTERM)
+            await asyncio.sleep(0.1)
+            os.killpg(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await asyncio.gather(
+            *(client.close() for client in self.clients), return_exceptions=True
+        )
+        self.clients.clear()
+        self.owner = None
+        if self.master_fd is None:
+            return
+        loop = asyncio.get_running_loop()
+        if self._writing:
+            loop.remove_writer(self.master_fd)
+            self._writing = False
+        self._pending.clear()
+        try:
+            os.close(self.master_fd)
+        except OSError:
+            pass
+        self.master_fd = None
+
+
+class OutputWindow:
+    """
+    Flow control for one client. The client acknowledges the total number
+    of output bytes it has processed so far, and wait() holds the sender
+    back while more than `size` bytes are unacknowledged.
+    """
+
+    def __init__(self, size: int = TERMINAL_FLOW_WINDOW):
+        self.size = size
+        self.sent = 0
+        self.acked = 0
+        self.pauses = 0
+        self._open = asyncio.Event()
+        self._open.set()
+
+    @property
+    def unacked(self) -> int:
+        return self.sent - self.acked
+
+    def on_sent(self, n: int):
+        self.sent += n
+        if self.unacked >= self.size and self._open.is_set():
+            self._open.clear()
+            self.pauses += 1
+
+    def ack(self, total: int):
+        self.acked = max(self.acked, min(total, self.sent))
+        if self.unacked < self.size:
+            self._open.set()
+
+    async def wait(self):
+        await self._open.wait()
+
+
+class TerminalSessionRegistry:
+    """The terminal sessions of this process, by id."""
+
+    def __init__(self):
+        self.sessions: Dict[str, TerminalSession] = {}
+        self._expiry: Dict[str, asyncio.Task] = {}
+
+    def create(self, command: str) -> TerminalSession:
+        session = TerminalSession(command)
+        session.start()
+        self.sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[TerminalSession]:
+        return self.sessions.get(session_id)
+
+    def find(self, command: str) -> Optional[TerminalSession]:
+        """A session still running command, if there is one."""
+        for session in self.sessions.values():
+            if session.command == command and not session.finished.is_set():
+                return session
+        return None
+
+    async def attach(self, session: TerminalSession, client: TerminalClient):
+        expiry = self._expiry.pop(session.id, None)
+        if expiry is not None:
+            expiry.cancel()
+        await session.attach(client)
+
+    async def detach(self, session: TerminalSession, client: TerminalClient):
+        """
+        Detach client. Once no clients are left, a finished session is closed,
+        and a running one is closed unless a client reattaches in time.
+        """
+        session.detach(client)
+        if session.clients:
+            return
+        if session.finished.is_set():
+            await self.close(session)
+        elif session.id not in self._expiry:
+            self._expiry[session.id] = asyncio.create_task(self._expire(session))
+
+    async def _expire(self, session: TerminalSession):
+        await asyncio.sleep(TERMINAL_GRACE_PERIOD)
+        self._expiry.pop(session.id, None)
+        if not session.clients:
+            logger.info(f"Closing detached terminal session: {session.command}")
+            await self.close(session)
+
+    async def close(self, session: TerminalSession):
+        self.sessions.pop(session.id, None)
+        expiry = self._expiry.pop(session.id, None)
+        if expiry is not None:
+            expiry.cancel()
+        await session.close()
+        logger.info(
+            f"Terminal session closed: {session.bytes_read} bytes out, "
+            f"{session.bytes_written} bytes in"
+        )
+
+    async def close_all(self):
+        for session in list(self.sessions.values()):
+            await self.close(session)
+
+
+sessions = TerminalSessionRegistry()
+
+
+def _set_done(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
@@ -1,45 +1,213 @@
 import os
-import subprocess
-from typing import Optional, TypedDict, Union
+from typing import Callable, Dict, List, Optional, TypedDict, Union
 import re
 from pathlib import Path
-import socket
 import asyncio
-from app.models.events import TmuxSessionChangedEvent
-from app.broadcast import broadcast
+import logging
+from app.models.events import TmuxSessionChangedEvent, TmuxCwdChangedEvent
+from app.broadcast import broadcast, get_state
+
+logger = logging.getLogger(__name__)
 
 TMUX_SESSION_DEFAULT = "work"
 
-# Socket that shows tmux session state changes from tmux hooks
+# Socket that the shell prompt hook (report-cwd.sh) reports working
+# directory changes to:
 SOCKET_PATH = "/run/tmux-event.sock"
+SOCKET_READ_TIMEOUT = 1
+SOCKET_MESSAGE_LIMIT = 65536
+
+TMUX_COMMAND_TIMEOUT = float(os.getenv("TMUX_COMMAND_TIMEOUT", "5"))
+# How long to gather window notifications before broadcasting the change:
+TMUX_NOTIFY_DEBOUNCE = float(os.getenv("TMUX_NOTIFY_DEBOUNCE", "0.05"))
+# How often to try to reattach to a session that doesn't exist (yet):
+TMUX_RECONNECT_INTERVAL = float(os.getenv("TMUX_RECONNECT_INTERVAL", "2"))
+
+
+class TmuxError(RuntimeError):
+    pass
 
 
-def window_exists(session_name: str, window_name: str) -> bool:
+def quote(arg: str) -> str:
+    """Quote an argument for the tmux command parser."""
+    for char, escaped in (
+        ("\\", "\\\\"),
+        ('"', '\\"'),
+        ("$", "\\$"),
+        ("\n", "\\n"),
+        ("\r", "\\r"),
+        ("\t", "\\t"),
+    ):
+        arg = arg.replace(char, escaped)
+    return f'"{arg}"'
+
+
+class TmuxControlClient:
+    """
+    A long-lived `tmux -C` control mode client attached to one session.
+
+    Commands are written to its stdin, and tmux answers each one, in order,
+    with its output between %begin and %end (or %error) lines. Any other
+    line starting with % is a notification, which is passed to the
+    registered notification handlers.
+    """
+
+    def __init__(self, session: str):
+        self.session = session
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.notification_handlers: List[Callable[[str, List[str]], None]] = []
+        self._pending: List[asyncio.Future] = []
+        self._reader: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+        self._attached: Optional[asyncio.Future] = None
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            "tmux",
+            "-C",
+            "attach-session",
+            "-t",
+            self.session,
+            # Don't send pane output, or resize the session's windows:
+            "-f",
+            "no-output,ignore-size",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        self._attached = asyncio.get_running_loop().create_future()
+        self._reader = asyncio.create_task(self._read())
+        # Commands sent before the attach is done would run without a session:
+        try:
+            await asyncio.wait_for(self._attached, TMUX_COMMAND_TIMEOUT)
+        except (TmuxError, asyncio.TimeoutError):
+            await self.close()
+            raise TmuxError(f"No tmux session exists named {self.session}")
+
+    async def command(self, *args: str) -> List[str]:
+        """Run a tmux command, and return its output lines."""
+        if not self.running:
+            raise TmuxError(f"No tmux session exists named {self.session}")
+        line = " ".join(args[:1] + tuple(quote(arg) for arg in args[1:]))
+        reply = asyncio.get_running_loop().create_future()
+        async with self._write_lock:
+            # Replies come in the order that the commands are written:
+            self._pending.append(reply)
+            try:
+                self.process.stdin.write(line.encode() + b"\n")
+                await self.process.stdin.drain()
+            except ConnectionError as e:
+                raise TmuxError(f"tmux control client for {self.session} exited") from e
+        return await asyncio.wait_for(reply, TMUX_COMMAND_TIMEOUT)
+
+    async def _read(self):
+        output = None
+        try:
+            while line := await self.process.stdout.readline():
+                line = line.decode(errors="replace").rstrip("\n")
+                if output is not None and not line.startswith(("%end ", "%error ")):
+                    output.append(line)
+                    continue
+                name, *args = line.split(" ")
+                if name == "%begin":
+                    output = []
+                elif name in ("%end", "%error"):
+                    # Flags are 1 for commands this client sent, and 0 for the
+                    # attach command it started with:
+                    if args[-1] == "0" and not self._attached.done():
+                        if name == "%end":
+                            self._attached.set_result(None)
+                        else:
+                            self._attached.set_exception(TmuxError("\n".join(output)))
+                    elif args[-1] == "1" and self._pending:
+                        reply = self._pending.pop(0)
+                        if reply.done():
+                            pass
+                        elif name == "%end":
+                            reply.set_result(output)
+                        else:
+                            reply.set_exception(TmuxError("\n".join(output)))
+                    output = None
+                elif name.startswith("%"):
+                    for handler in self.notification_handlers:
+                        handler(name, args)
+        finally:
+            for reply in [self._attached, *self._pending]:
+                if not reply.done():
+                    reply.set_exception(
+                        TmuxError(f"tmux control client for {self.session} exited")
+                    )
+            self._pending.clear()
+            await self.process.wait()
+
+    async def wait_closed(self):
+        if self._reader is not None:
+            await asyncio.wait([self._reader])
+
+    async def close(self):
+        if self.running:
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), 1)
+            except asyncio.TimeoutError:
+                self.process.kill()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+
+
+control_clients: Dict[str, TmuxControlClient] = {}
+_control_client_lock = asyncio.Lock()
+
+
+async def get_control_client(session_name: str) -> TmuxControlClient:
+    """
+    The session's control client, attaching a new one if needed. Raises
+    TmuxError if there is no such session.
+    """
+    async with _control_client_lock:
+        client = control_clients.get(session_name)
+        if client is None or not client.running:
+            client = TmuxControlClient(session_name)
+            await client.start()
+            control_clients[session_name] = client
+        return client
+
+
+async def tmux(session_name: str, *args: str) -> List[str]:
+    """Run a tmux command on the session's control client."""
+    client = await get_control_client(session_name)
+    return await client.command(*args)
+
+
+async def close_control_clients():
+    for client in list(control_clients.values()):
+        await client.close()
+    control_clients.clear()
+
+
+async def window_exists(session_name: str, window_name: str) -> bool:
     try:
-        output = subprocess.check_output(
-            ["tmux", "list-windows", "-t", session_name],
-            stderr=subprocess.DEVNULL,
-        ).decode()
-        return any(
-            f"{window_name}" in line.split(":")[1].strip()
-            for line in output.splitlines()
+        output = await tmux(
+            session_name, "list-windows", "-t", session_name, "-F", "#{window_name}"
         )
-    except subprocess.CalledProcessError:
+        return any(f"{window_name}" in line.strip() for line in output)
+    except TmuxError:
         return False
 
 
-def session_exists(session_name: str) -> bool:
+async def session_exists(session_name: str) -> bool:
     try:
-        subprocess.check_output(
-            ["tmux", "has-session", "-t", session_name],
-            stderr=subprocess.DEVNULL,
-        )
+        await get_control_client(session_name)
         return True
-    except subprocess.CalledProcessError:
+    except TmuxError:
         return False
 
 
-def create_new_window(
+async def create_new_window(
     session_name: str,
     window_name: str = "new",
     active: bool = False,
@@ -53,44 +221,32 @@ def create_new_window(
     :param active: If True, switch to the new window after creation
     :return: The index of the newly created window
     """
-    if not session_exists(session_name):
+    if not await session_exists(session_name):
         raise RuntimeError(f"No tmux session exists named {session_name}")
 
-    # Get current window indexes
-    output = subprocess.check_output(
-        ["tmux", "list-windows", "-t", session_name, "-F", "#{window_index}"],
-        stderr=subprocess.DEVNULL,
-    ).decode()
-
-    existing_indexes = sorted(
-        int(line.strip())
-        for line in output.strip().splitlines()
-        if line.strip().isdigit()
+    # Create the new window after the last one:
+    output = await tmux(
+        session_name,
+        "new-window",
+        *([] if active else ["-d"]),
+        "-a",
+        "-t",
+        f"{session_name}:{{end}}",
+        "-P",
+        "-F",
+        "#{window_id}::#{window_index}",
+        "-n",
+        window_name,
+        command,
     )
-    new_index = (existing_indexes[-1] + 1) if existing_indexes else 0
-
-    # Create the new window at the desired index
-    subprocess.check_call(
-        [
-            "tmux",
-            "new-window",
-            "-t",
-            f"{session_name}:{new_index}",
-            "-n",
-            window_name,
-            command,
-        ]
-    )
-
-    if active:
-        subprocess.check_call(
-            ["tmux", "select-window", "-t", f"{session_name}:{new_index}"]
-        )
-
-    return new_index
+    window_id, index = output[0].split("::")
+    watcher = get_window_watcher(session_name)
+    if watcher is not None:
+        await watcher.window_added(window_id, int(index), window_name, active)
+    return int(index)
 
 
-def inject_command_to_tmux(
+async def inject_command_to_tmux(
     session_name: str,
     command: str,
     window_name: str = "injected",
@@ -100,15 +256,17 @@ def inject_command_to_tmux(
     """
     Create a new tmux window in the given session, inject a command, and optionally run it or make it active.
     """
-    new_index = create_new_window(session_name, window_name=window_name, active=active)
+    new_index = await create_new_window(
+        session_name, window_name=window_name, active=active
+    )
     target = f"{session_name}:{new_index}"
 
-    subprocess.check_call(["tmux", "send-keys", "-t", target, command])
+    await tmux(session_name, "send-keys", "-t", target, command)
     if autorun:
-        subprocess.check_call(["tmux", "send-keys", "-t", target, "Enter"])
+        await tmux(session_name, "send-keys", "-t", target, "Enter")
 
 
-def get_tmux_pane_cwd_path(session: str) -> Optional[str]:
+async def get_tmux_pane_cwd_path(session: str) -> Optional[str]:
     def get_latest_child_pid(pid: str) -> str:
         """Recursively find the most recent child/grandchild process."""
         try:
@@ -122,43 +280,100 @@ def get_tmux_pane_cwd_path(session: str) -> Optional[str]:
             return pid
 
     try:
-        # 1. Get the pane ID
-        pane_id = (
-            subprocess.check_output(
-                ["tmux", "display-message", "-p", "-t", session, "#{pane_id}"],
-                stderr=subprocess.DEVNULL,
-            )
-            .decode()
-            .strip()
+        # The active pane's PID:
+        output = await tmux(
+            session, "display-message", "-p", "-t", session, "#{pane_pid}"
         )
-        if not pane_id:
-            return None
-
-        # 2. Get pane PID
-        lines = (
-            subprocess.check_output(
-                ["tmux", "list-panes", "-t", session, "-F", "#{pane_id} #{pane_pid}"],
-                stderr=subprocess.DEVNULL,
-            )
-            .decode()
-            .splitlines()
+    except TmuxError:
+        return None
+    if not output or not output[0]:
+        return None
+
+    # Find the latest descendant PID
+    active_pid = get_latest_child_pid(output[0].strip())
+    path = f"/proc/{active_pid}/cwd"
+    if os.path.exists(path):
+        return path
+    return None
+
+
+async def get_active_pane(session: str) -> Optional[str]:
+    try:
+        output = await tmux(
+            session, "display-message", "-p", "-t", session, "#{pane_id}"
         )
+    except TmuxError:
+        return None
+    return output[0].strip() if output and output[0].strip() else None
 
-        for tid, pid in (line.split() for line in lines):
-            if tid == pane_id:
-                # 3. Find the latest descendant PID
-                active_pid = get_latest_child_pid(pid)
-                path = f"/proc/{active_pid}/cwd"
-                if os.path.exists(path):
-                    return path
 
-    except subprocess.CalledProcessError:
-        pass
+async def read_pane_cwd(session: str) -> Optional[str]:
+    path_link = await get_tmux_pane_cwd_path(session)
+    if not path_link:
+        return None
+    try:
+        return os.readlink(path_link)
+    except OSError:
+        return None
 
-    return None
+
+class CwdTracker:
+    """
+    Follows the working directory of the active pane of one tmux session.
+    The shells report their own cwd whenever it changes, and the control
+    client's notifications report pane switches, so nothing is polled. Changes are broadcast as
+    TmuxCwdChangedEvents.
+    """
+
+    def __init__(self, session: str):
+        self.session = session
+        self.pane_cwds: Dict[str, str] = {}
+        self.active_pane: Optional[str] = None
+
+    async def pane_cwd_changed(self, pane: str, path: str):
+        self.pane_cwds[pane] = path
+        if self.active_pane is None:
+            self.active_pane = await get_active_pane(self.session)
+        if pane == self.active_pane:
+            await self._publish(path)
+
+    async def active_pane_changed(self):
+        pane = await get_active_pane(self.session)
+        if pane is None or pane == self.active_pane:
+            return
+        self.active_pane = pane
+        path = self.pane_cwds.get(pane)
+        if path is None:
+            # The pane's shell hasn't reported in since we started:
+            path = await read_pane_cwd(self.session)
+        if path:
+            await self._publish(path)
+
+    async def _publish(self, path: str):
+        current = get_state(("tmux_cwd_changed", self.session))
+        if current is None or current.path != path:
+            await broadcast(TmuxCwdChangedEvent(session=self.session, path=path))
+
+
+cwd_trackers: Dict[str, CwdTracker] = {}
 
 
-def get_windows(session_name: str) -> dict[str, Union[list[dict], int]]:
+def get_cwd_tracker(session: str) -> CwdTracker:
+    tracker = cwd_trackers.get(session)
+    if tracker is None:
+        tracker = cwd_trackers[session] = CwdTracker(session)
+    return tracker
+
+
+async def get_session_cwd(session: str) -> Optional[str]:
+    """The last known working directory of the session's active pane."""
+    event = get_state(("tmux_cwd_changed", session))
+    if event is not None:
+        return event.path
+    return await read_pane_cwd(session)
+
+
+async def get_windows(session_name: str) -> dict[str, Union[list[dict], int]]:
     """
     Return a dictionary with all window names and indexes,
     and the index of the currently active window.
@@ -166,22 +381,19 @@ def get_windows(session_name: str) -> dict[str, Union[list[dict], int]]:
     :param session_name: The name of the tmux session
     :return: Dict with keys: 'windows' (list of dicts with name/index), 'active' (index)
     """
-    if not session_exists(session_name):
+    if not await session_exists(session_name):
         raise RuntimeError(f"Session '{session_name}' does not exist")
 
     try:
-        output = subprocess.check_output(
-            [
-                "tmux",
-                "list-windows",
-                "-t",
-                session_name,
-                "-F",
-                "#{window_index}::#{window_name}::#{window_active}",
-            ],
-            stderr=subprocess.DEVNULL,
-        ).decode()
-    except subprocess.CalledProcessError as e:
+        output = await tmux(
+            session_name,
+            "list-windows",
+            "-t",
+            session_name,
+            "-F",
+            "#{window_index}::#{window_name}::#{window_active}",
+        )
+    except TmuxError as e:
         raise RuntimeError(
             f"Failed to list windows for session '{session_name}'"
         ) from e
@@ -189,7 +401,7 @@ def get_windows(session_name: str) -> dict[str, Union[list[dict], int]]:
     windows = []
     active_index = None
 
-    for line in output.strip().splitlines():
+    for line in output:
         try:
             index_str, name, active_flag = line.split("::", 2)
             index = int(index_str)
@@ -208,36 +420,301 @@ def get_windows(session_name: str) -> dict[str, Union[list[dict], int]]:
     }
 
 
-async def start_tmux_socket_listener():
-    # Clean up old socket if needed
-    sock_path = Path(SOCKET_PATH)
-    if sock_path.exists():
-        sock_path.unlink()
+class WindowWatcher:
+    """
+    Keeps a model of one tmux session's windows up to date from the control
+    client's notifications, and broadcasts a TmuxSessionChangedEvent when
+    it changes. Bursts of notifications (eg. a window closing, and the
+    session switching to another one) are debounced into a single event.
 
-    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    server.bind(SOCKET_PATH)
-    server.listen()
+    The app's own changes are applied to the model (and broadcast) as soon
+    as tmux accepts them, so the notifications that follow find nothing new.
+    """
 
-    print(f"[tmux] Listening for tmux events on {SOCKET_PATH}")
+    def __init__(self, session: str):
+        self.session = session
+        self.session_id: Optional[str] = None
+        # Window id (@n) -> {"index": int, "name": str}
+        self.windows: Dict[str, dict] = {}
+        self.active: Optional[str] = None
+        # Whether the model needs reloading from tmux before publishing:
+        self._stale = True
+        self._pane_changed = False
+        self._flush: Optional[asyncio.TimerHandle] = None
+        self._publish_task: Optional[asyncio.Task] = None
+        # Set while attached to the session, when the model can be trusted:
+        self.ready = asyncio.Event()
+
+    async def attach(self, client: TmuxControlClient):
+        client.notification_handlers.append(self.on_notification)
+        (self.session_id,) = await client.command(
+            "display-message", "-p", "-t", self.session, "#{session_id}"
+        )
+        self._stale = True
+        self._pane_changed = True
+        # Pane ids start over if the tmux server was restarted:
+        cwd_trackers.pop(self.session, None)
+        await self.publish()
+        self.ready.set()
+
+    def detach(self):
+        self.ready.clear()
+        self._stale = True
+
+    def find(self, index: int) -> Optional[str]:
+        for window_id, window in self.windows.items():
+            if window["index"] == index:
+                return window_id
+        return None
+
+    async def window_added(self, window_id: str, index: int, name: str, active: bool):
+        self.windows[window_id] = {"index": index, "name": name}
+        if active:
+            self.active = window_id
+            self._pane_changed = True
+        await self.publish()
+
+    async def window_selected(self, index: int):
+        window_id = self.find(index)
+        if window_id is None:
+            self._stale = True
+        elif window_id != self.active:
+            self.active = window_id
+            self._pane_changed = True
+        await self.publish()
+
+    async def window_renamed(self, index: int, name: str):
+        window_id = self.find(index)
+        if window_id is None:
+            self._stale = True
+        else:
+            self.windows[window_id]["name"] = name
+        await self.publish()
+
+    async def window_closed(self, index: int):
+        window_id = self.find(index)
+        self.windows.pop(window_id, None)
+        if window_id is None or window_id == self.active:
+            # tmux picks the next active window:
+            self._stale = True
+        await self.publish()
+
+    def on_notification(self, name: str, args: List[str]):
+        if name == "%window-add":
+            # The notification doesn't say where the window went:
+            self._stale = True
+        elif name in ("%window-close", "%unlinked-window-close"):
+            self.windows.pop(args[0], None)
+        elif name == "%window-renamed":
+            if args[0] in self.windows:
+                self.windows[args[0]]["name"] = " ".join(args[1:])
+        elif name == "%session-window-changed":
+            if args[0] != self.session_id:
+                return
+            self.active = args[1]
+            self._pane_changed = True
+        elif name == "%window-pane-changed":
+            if args[0] != self.active:
+                return
+            self._pane_changed = True
+        else:
+            return
+        if self._flush is None:
+            self._flush = asyncio.get_running_loop().call_later(
+                TMUX_NOTIFY_DEBOUNCE,
+                self._start_publish,
+            )
+
+    async def reload(self):
+        output = await tmux(
+            self.session,
+            "list-windows",
+            "-t",
+            self.session,
+            "-F",
+            "#{window_id}::#{window_index}::#{window_active}::#{window_name}",
+        )
+        self.windows = {}
+        for line in output:
+            try:
+                window_id, index, active, name = line.split("::", 3)
+                self.windows[window_id] = {"index": int(index), "name": name}
+            except ValueError:
+                continue
+            if active == "1":
+                self.active = window_id
+        self._stale = False
+
+    def state(self) -> dict:
+        windows = sorted(self.windows.values(), key=lambda w: w["index"])
+        active = self.windows.get(self.active)
+        return {
+            "windows": [dict(w) for w in windows],
+            "active": active["index"] if active else None,
+        }
+
+    async def publish(self):
+        if self._flush is not None:
+            self._flush.cancel()
+            self._flush = None
+        try:
+            if self._stale:
+                await self.reload()
+            state = self.state()
+            current = get_state(("tmux_session_changed", self.session))
+            if current is None or (current.windows, current.active) != (
+                state["windows"],
+                state["active"],
+            ):
+                await broadcast(
+                    TmuxSessionChangedEvent.model_construct(
+                        session=self.session, **state
+                    )
+                )
+            if self._pane_changed:
+                self._pane_changed = False
+                await get_cwd_tracker(self.session).active_pane_changed()
+        except (TmuxError, asyncio.TimeoutError) as e:
+            # The session went away, the watcher reattaches when it's back:
+            logger.warning(f"Failed to update windows of {self.session}: {e!r}")
+
+    def _start_publish(self):
+        self._publish_task = asyncio.create_task(self._publish_later())
+
+    async def _publish_later(self):
+        try:
+            await self.publish()
+        except Exception:
+            # Nothing awaits this task, so this is the only place to see it:
+            logger.exception(f"Failed to publish windows of {self.session}")
 
-    loop = asyncio.get_running_loop()
 
-    while True:
-        conn, _ = await loop.sock_accept(server)
-        data = await loop.sock_recv(conn, 1024)
-        print(f"[tmux] socket yielded data: {data}")
-        session_name = data.decode().strip()
-        conn.close()
+window_watchers: Dict[str, WindowWatcher] = {}
 
+
+async def watch_tmux_session(session_name: str = TMUX_SESSION_DEFAULT):
+    """
+    Follow the session's windows for as long as the app runs, reattaching
+    whenever the session comes back after it exits.
+    """
+    watcher = window_watchers.get(session_name)
+    if watcher is None:
+        watcher = window_watchers[session_name] = WindowWatcher(session_name)
+    while True:
         try:
-            state = get_windows(session_name)
-            event = TmuxSessionChangedEvent(session=session_name, **state)
-            await broadcast(event)
-        except Exception as e:
-            print(f"[tmux] Failed to broadcast update: {e}")
+            client = await get_control_client(session_name)
+            await watcher.attach(client)
+            logger.info(f"Watching tmux session {session_name}")
+            await client.wait_closed()
+        except (TmuxError, asyncio.TimeoutError) as e:
+            logger.debug(f"Can't watch tmux session {session_name}: {e!r}")
+        finally:
+            watcher.detach()
+        await asyncio.sleep(TMUX_RECONNECT_INTERVAL)
+
+
+# The running watch_tmux_session() task of each watched session:
+watch_tasks: Dict[str, asyncio.Task] = {}
+
+
+def start_watching(session_name: str = TMUX_SESSION_DEFAULT) -> asyncio.Task:
+    """Start following the session's windows, unless that's already running."""
+    task = watch_tasks.get(session_name)
+    if task is None:
+        task = asyncio.create_task(watch_tmux_session(session_name))
+        watch_tasks[session_name] = task
+        task.add_done_callback(lambda task: _watch_done(session_name, task))
+    return task
+
+
+def _watch_done(session_name: str, task: asyncio.Task):
+    if watch_tasks.get(session_name) is task:
+        del watch_tasks[session_name]
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(
+            f"Stopped watching tmux session {session_name}",
+            exc_info=task.exception(),
+        )
+
+
+async def stop_watching():
+    tasks = list(watch_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
 
-def set_window_active(session_name: str, window_index: int) -> bool:
+def get_window_watcher(session_name: str) -> Optional[WindowWatcher]:
+    """The session's watcher, if it is attached and its model is usable."""
+    watcher = window_watchers.get(session_name)
+    return watcher if watcher is not None and watcher.ready.is_set() else None
+
+
+async def get_window_state(session_name: str) -> dict[str, Union[list[dict], int]]:
+    """
+    Like get_windows(), but from the session's window model when there is
+    one, instead of asking tmux.
+    """
+    watcher = get_window_watcher(session_name)
+    if watcher is None:
+        state = await get_windows(session_name)
+        # Every worker keeps a model of the sessions it serves:
+        start_watching(session_name)
+        return state
+    if watcher._stale:
+        await watcher.reload()
+    return watcher.state()
+
+
+async def read_cwd_report(reader: asyncio.StreamReader) -> bytes:
+    data = b""
+    while chunk := await reader.read(4096):
+        data += chunk
+        if len(data) > SOCKET_MESSAGE_LIMIT:
+            raise ValueError(f"Report longer than {SOCKET_MESSAGE_LIMIT} bytes")
+    return data
+
+
+async def handle_cwd_report(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        data = await asyncio.wait_for(read_cwd_report(reader), SOCKET_READ_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Timed out reading a cwd report")
+        return
+    except ValueError as e:
+        logger.warning(f"Ignoring cwd report: {e}")
+        return
+    finally:
+        writer.close()
+    message = data.decode(errors="replace").strip()
+
+    if not message.startswith("cwd\t"):
+        logger.warning(f"Ignoring unknown socket message: {data!r}")
+        return
+    # "cwd<TAB>session<TAB>pane<TAB>path" from report-cwd.sh
+    try:
+        _, session_name, pane, path = message.split("\t", 3)
+    except ValueError:
+        logger.warning(f"Ignoring malformed cwd report: {data!r}")
+        return
+    await get_cwd_tracker(session_name).pane_cwd_changed(pane, path)
+
+
+async def start_tmux_socket_listener():
+    # Clean up old socket if needed
+    sock_path = Path(SOCKET_PATH)
+    if sock_path.exists():
+        sock_path.unlink()
+
+    # Each connection is handled in its own task, so a slow client doesn't
+    # hold up the reports from other panes:
+    server = await asyncio.start_unix_server(handle_cwd_report, path=SOCKET_PATH)
+    logger.info(f"Listening for cwd reports on {SOCKET_PATH}")
+    async with server:
+        await server.serve_forever()
+
+
+async def set_window_active(session_name: str, window_index: int) -> bool:
     """
     Makes the window at the given index active in the tmux session.
 
@@ -245,22 +722,24 @@ def set_window_active(session_name: str, window_index: int) -> bool:
     :param window_index: Index of the window to activate
     :return: True if successful, False otherwise
     """
-    if not session_exists(session_name):
+    if not await session_exists(session_name):
         return False
 
     try:
-        subprocess.check_call(
-            ["tmux", "select-window", "-t", f"{session_name}:{window_index}"],
-            stderr=subprocess.DEVNULL,
+        await tmux(
+            session_name, "select-window", "-t", f"{session_name}:{window_index}"
         )
-        return True
-    except subprocess.CalledProcessError:
+    except TmuxError:
         raise RuntimeError(
             f"Could not activate window {window_index} in session: {session_name}"
         )
+    watcher = get_window_watcher(session_name)
+    if watcher is not None:
+        await watcher.window_selected(window_index)
+    return True
 
 
-def delete_window(session_name: str, window_index: int) -> bool:
+async def delete_window(session_name: str, window_index: int) -> bool:
     """
     Deletes the specified tmux window by killing the window.
 
@@ -269,16 +748,17 @@ def delete_window(session_name: str, window_index: int) -> bool:
     :return: True if successful, False otherwise
     """
     try:
-        subprocess.check_call(
-            ["tmux", "kill-window", "-t", f"{session_name}:{window_index}"]
-        )
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"Failed to delete tmux window: {e}")
+        await tmux(session_name, "kill-window", "-t", f"{session_name}:{window_index}")
+    except TmuxError as e:
+        logger.warning(f"Failed to delete tmux window: {e}")
         return False
+    watcher = get_window_watcher(session_name)
+    if watcher is not None:
+        await watcher.window_closed(window_index)
+    return True
 
 
-def rename_window(session_name: str, window_index: int, new_name: str) -> bool:
+async def rename_window(session_name: str, window_index: int, new_name: str) -> bool:
     """
     Renames a tmux window in the specified session.
 
@@ -288,13 +768,19 @@ def rename_window(session_name: str, window_index: int, new_name: str) -> bool:
     :return: True if successful, False otherwise
     """
     try:
-        subprocess.check_call(
-            ["tmux", "rename-window", "-t", f"{session_name}:{window_index}", new_name],
-            stderr=subprocess.DEVNULL,
+        await tmux(
+            session_name,
+            "rename-window",
+            "-t",
+            f"{session_name}:{window_index}",
+            new_name,
         )
-        return True
-    except subprocess.CalledProcessError as e:
-        print(
+    except TmuxError as e:
+        logger.warning(
             f"Failed to rename window {window_index} in session '{session_name}': {e}"
         )
         return False
+    watcher = get_window_watcher(session_name)
+    if watcher is not None:
+        await watcher.window_renamed(window_index, new_name)
+    return True
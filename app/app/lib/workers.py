@@ -0,0 +1,56 @@
+"""
+Settings for running the app in more than one uvicorn worker process.
+
+With APP_WORKERS > 1, state that has to be the same in every worker (the
+event bus and the rate limit counters) is kept in a SQLite database shared
+by the workers. The singleton background tasks run only in whichever
+worker holds the leader lock.
+"""
+
+import os
+import sqlite3
+from pathlib import Path
+
+import aiosqlite
+
+APP_WORKERS = int(os.getenv("APP_WORKERS") or "1")
+MULTI_WORKER = APP_WORKERS > 1
+
+RUN_PATH = Path(os.getenv("HOME")) / "dry_agent" / "run"
+SHARED_DB_PATH = RUN_PATH / "shared.db"
+
+SHARED_DB_PRAGMAS = [
+    "pragma journal_mode = WAL",
+    "pragma synchronous = NORMAL",
+]
+# How long a write waits for another worker's write to finish. Every write
+# is a single short statement, so this is only reached if a worker is stuck:
+SHARED_DB_BUSY_TIMEOUT = 5000
+
+
+def connect_shared_db(
+    path: Path = SHARED_DB_PATH, busy_timeout: int = SHARED_DB_BUSY_TIMEOUT
+) -> sqlite3.Connection:
+    """
+    Open the shared database in autocommit mode, for use by one thread.
+    Calls on it block, so keep them off the event loop, or keep busy_timeout
+    (in milliseconds) short.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    for pragma in SHARED_DB_PRAGMAS:
+        conn.execute(pragma)
+    conn.execute(f"pragma busy_timeout = {int(busy_timeout)}")
+    return conn
+
+
+async def connect_shared_db_async(
+    path: Path = SHARED_DB_PATH,
+) -> aiosqlite.Connection:
+    """Open the shared database in autocommit mode, on its own thread."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = await aiosqlite.connect(path, isolation_level=None)
+    for pragma in SHARED_DB_PRAGMAS:
+        await conn.execute(pragma)
+    await conn.execute(f"pragma busy_timeout = {SHARED_DB_BUSY_TIMEOUT}")
+    return conn
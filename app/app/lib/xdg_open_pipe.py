@@ -4,21 +4,48 @@ from app.models.events import OpenURLEvent
 import asyncio
 
 PIPE_PATH = "/tmp/xdg_open_pipe"
+PIPE_READ_SIZE = 65536
+
+
+def read_available(fd: int) -> bytes:
+    """Read everything that is in the pipe right now, without blocking."""
+    data = b""
+    while True:
+        try:
+            chunk = os.read(fd, PIPE_READ_SIZE)
+        except BlockingIOError:
+            return data
+        if not chunk:
+            return data
+        data += chunk
 
 
 async def watch_xdg_open_pipe():
     os.makedirs(os.path.dirname(PIPE_PATH), exist_ok=True)
     if not os.path.exists(PIPE_PATH):
         os.mkfifo(PIPE_PATH)
-    loop = asyncio.get_running_loop()  # capture main loop
-
-    def blocking_watch():
-        with open(PIPE_PATH, "r") as pipe:
-            while True:
-                url = pipe.readline().strip()
-                if url:
-                    loop.call_soon_threadsafe(
-                        asyncio.create_task, broadcast(OpenURLEvent(url=url))
-                    )
+    loop = asyncio.get_running_loop()
 
-    await asyncio.to_thread(blocking_watch)
+    read_fd = os.open(PIPE_PATH, os.O_RDONLY | os.O_NONBLOCK)
+    # Hold a writer open ourselves, so that the pipe never reaches EOF when
+    # the last xdg-open closes it (which would make it readable forever):
+    write_fd = os.open(PIPE_PATH, os.O_WRONLY | os.O_NONBLOCK)
+    readable = asyncio.Event()
+    loop.add_reader(read_fd, readable.set)
+    pending = b""
+    try:
+        while True:
+            await readable.wait()
+            readable.clear()
+            *lines, pending = (pending + read_available(read_fd)).split(b"\n")
+            # Everything written since the last wakeup is sent together, and
+            # a URL opened several times at once is only opened once:
+            urls = dict.fromkeys(
+                url for line in lines if (url := line.decode(errors="replace").strip())
+            )
+            for url in urls:
+                await broadcast(OpenURLEvent(url=url))
+    finally:
+        loop.remove_reader(read_fd)
+        os.close(read_fd)
+        os.close(write_fd)
@@ -15,8 +15,19 @@ from .middleware.auth import (
 )
 import logging
 from app.lib.docker_context_watcher import monitor_docker_context
-from app.lib.tmux import start_tmux_socket_listener
+from app.lib.instance_status import follow_all_contexts
+from app.lib.tmux import (
+    start_tmux_socket_listener,
+    start_watching as start_watching_tmux,
+    stop_watching as stop_watching_tmux,
+    close_control_clients,
+)
 from app.lib.xdg_open_pipe import watch_xdg_open_pipe
+from app.routes.api.project_catalog import catalog
+from app.lib.db import pool as db_pool
+from app.lib.leader import leader
+from app.broadcast import start_transport, stop_transport
+from app.lib.terminal_session import sessions as terminal_sessions
 import asyncio
 from app.lib.rate_limit import limiter, SlowAPIMiddleware, RateLimitExceeded
 
@@ -89,8 +100,28 @@ app.include_router(api_routes.chat.router)
 app.include_router(api_routes.events.router)
 
 
-@app.on_event("startup")
-async def start_background_tasks():
+async def start_singleton_tasks():
+    """Tasks that must only run in one worker at a time."""
     asyncio.create_task(monitor_docker_context())
+    asyncio.create_task(follow_all_contexts())
     asyncio.create_task(watch_xdg_open_pipe())
     asyncio.create_task(start_tmux_socket_listener())
+    start_watching_tmux()
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    await db_pool.open()
+    await start_transport()
+    asyncio.create_task(leader.run_when_leader(start_singleton_tasks))
+    asyncio.create_task(catalog.refresh())
+    asyncio.create_task(api_routes.events.seed_context_state())
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await terminal_sessions.close_all()
+    await stop_watching_tmux()
+    await close_control_clients()
+    await stop_transport()
+    await db_pool.close()
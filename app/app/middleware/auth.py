@@ -1,4 +1,5 @@
 # app/middleware/auth.py
+import hmac
 import logging
 import time
 import secrets
@@ -15,8 +16,10 @@ from app.dependencies import templates
 from app.models.events import LogoutEvent
 from app.broadcast import broadcast
 import os
+from typing import Optional
 from app.lib.require_client_cn import require_client_cn
 from app.lib.rate_limit import limiter
+from app.lib.workers import MULTI_WORKER
 
 logger = logging.getLogger("auth")
 
@@ -41,8 +44,6 @@ def token():
         return "-".join(diceware(10))
 
 
-# Generate an initial token at startup using 10 diceware words joined by hyphens.
-current_token = token()
 APP_COOKIE_NAME = "dry_agent_auth"
 CSRF_COOKIE_NAME = "csrf_token"
 TOKEN_FILE = "/data/token/current_token.txt"
@@ -52,14 +53,67 @@ ALLOWED_CNS = {
 }
 
 
+# The token file is also how workers share the token: each one re-reads it
+# whenever the file is replaced.
+_token_file_id = None
+_current_token = None
+
+
 # Write the token to a file so it can be retrieved via CLI.
 def write_token_to_file(token_value: str):
-    with open(TOKEN_FILE, "w") as f:
+    tmp_file = f"{TOKEN_FILE}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
         f.write(token_value)
+    os.replace(tmp_file, TOKEN_FILE)
 
 
-# Write the initial token to file.
-write_token_to_file(current_token)
+def get_current_token() -> Optional[str]:
+    """
+    The current token, as last written by any worker, or None if no token
+    is known (the token file has never been readable).
+    """
+    global _token_file_id, _current_token
+    try:
+        stat = os.stat(TOKEN_FILE)
+        file_id = (stat.st_ino, stat.st_mtime_ns)
+        if file_id != _token_file_id:
+            with open(TOKEN_FILE) as f:
+                _current_token = f.read().strip() or None
+            _token_file_id = file_id
+    except OSError as e:
+        logger.warning(f"Could not read token file: {e}")
+    return _current_token
+
+
+def is_current_token(value: Optional[str]) -> bool:
+    """Whether value is the current token. Never true when no token is known."""
+    current = get_current_token()
+    if not value or not current:
+        return False
+    return hmac.compare_digest(value.encode(), current.encode())
+
+
+def init_token():
+    """
+    Generate an initial token at startup using 10 diceware words joined by
+    hyphens. With several workers, the first one to start publishes its
+    token and the rest adopt it (entrypoint.sh removes the old token file).
+    """
+    if not MULTI_WORKER:
+        write_token_to_file(token())
+        return
+    tmp_file = f"{TOKEN_FILE}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
+        f.write(token())
+    try:
+        os.link(tmp_file, TOKEN_FILE)
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(tmp_file)
+
+
+init_token()
 
 # Global rate limiting state (for all clients)
 failed_attempt_count = 0
@@ -97,7 +151,7 @@ class AuthMiddleware(BaseHTTPMiddleware):
 
         # Check the cookie value against the current token.
         cookie = request.cookies.get(APP_COOKIE_NAME)
-        if cookie != current_token:
+        if not is_current_token(cookie):
             # If the request is for an API endpoint, return a JSON error.
             if request.url.path.startswith("/api"):
                 return JSONResponse(
@@ -116,10 +170,8 @@ def add_auth_middleware(app):
 
 
 async def generate_new_token():
-    """Generate a new token, update the global token, and write it to file."""
-    global current_token
+    """Generate a new token and write it to file, where every worker sees it."""
     new_token = token()
-    current_token = new_token
     write_token_to_file(new_token)
     await broadcast(LogoutEvent())
     return new_token
@@ -129,7 +181,7 @@ async def generate_new_token():
 async def login_get(request: Request):
     # Check for a valid auth cookie.
     app_cookie = request.cookies.get(APP_COOKIE_NAME)
-    if app_cookie and app_cookie == current_token:
+    if is_current_token(app_cookie):
         # Return an HTML page that clears the URL fragment and redirects to '/'
         html_content = """
         <html>
@@ -185,7 +237,7 @@ async def login_post(request: Request, token: str = Form(...), csrf: str = Form(
     if not csrf_cookie or csrf != csrf_cookie:
         raise HTTPException(status_code=400, detail="Invalid CSRF token.")
 
-    if token == current_token:
+    if is_current_token(token):
         new_token = await generate_new_token()
         record_login_attempt(success=True)
         # Generate a new CSRF token for the new session.
@@ -215,7 +267,7 @@ async def login_post(request: Request, token: str = Form(...), csrf: str = Form(
 # /logout endpoint: Invalidate the current cookie by generating a new token.
 async def logout(request: Request, full: bool = Query(False)):
     cookie = request.cookies.get(APP_COOKIE_NAME)
-    if cookie == current_token:
+    if is_current_token(cookie):
         await generate_new_token()  # Invalidate any cookie with the old token.
     if full:
         response = RedirectResponse(
@@ -245,7 +297,7 @@ async def admin_get_login_url(request: Request):
     q = secrets.token_urlsafe(4)
     return JSONResponse(
         content={
-            "login_url": f"https://{PUBLIC_HOST}:{PUBLIC_PORT}/login?q={q}#{current_token}"
+            "login_url": f"https://{PUBLIC_HOST}:{PUBLIC_PORT}/login?q={q}#{get_current_token()}"
         }
     )
 
@@ -253,7 +305,8 @@ async def admin_get_login_url(request: Request):
 async def get_login_url(request: Request):
     host = request.headers.get("host")
     app_cookie = request.cookies.get(APP_COOKIE_NAME)
-    if app_cookie and app_cookie == current_token:
+    current_token = get_current_token()
+    if is_current_token(app_cookie):
         q = secrets.token_urlsafe(4)
         return JSONResponse(
             content={"login_url": f"https://{host}/login?q={q}#{current_token}"}
@@ -0,0 +1,44 @@
+"""conversation summary columns
+
+Revision ID: 5b7e2c91d4a3
+Revises: f882f425bee0
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import os
+
+# revision identifiers, used by Alembic.
+revision: str = "5b7e2c91d4a3"
+down_revision: Union[str, None] = "f882f425bee0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema using raw SQL file."""
+    current_dir = os.path.dirname(os.path.realpath(__file__))
+    sql_file_path = os.path.join(current_dir, f"{revision}_conversation_summary.sql")
+
+    with open(sql_file_path, "r") as file:
+        sql_commands = file.read()
+
+    # Split statements on semicolon followed by optional whitespace and a newline.
+    statements = [s.strip() for s in sql_commands.split(";") if s.strip()]
+
+    # Execute each statement one-by-one.
+    conn = op.get_bind()
+    for stmt in statements:
+        conn.execute(sa.text(stmt))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    conn.execute(sa.text("drop index conversation_modified_at"))
+    for column in ("preview", "modified_at", "message_count"):
+        conn.execute(sa.text(f"alter table conversation drop column {column}"))
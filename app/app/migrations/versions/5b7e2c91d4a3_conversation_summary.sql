@@ -0,0 +1,42 @@
+-- Denormalized conversation summary, maintained by add_message
+alter table conversation add column preview text;
+
+alter table conversation add column modified_at timestamp;
+
+alter table conversation add column message_count integer not null default 0;
+
+update
+    conversation
+set
+    message_count = (
+        select
+            count(*)
+        from
+            message m
+        where
+            m.conversation_id = conversation.id),
+    modified_at = coalesce((
+        select
+            max(m.created_at)
+        from message m
+        where
+            m.conversation_id = conversation.id), created_at),
+    preview = (
+        select
+            case when length(first_sentence) > 100 then
+                substr(first_sentence, 1, 100) || '...'
+            else
+                first_sentence
+            end
+        from (
+            select
+                substr(m.content, 1, instr (m.content || '.', '.') - 1) as first_sentence
+            from
+                message m
+            where
+                m.conversation_id = conversation.id
+            order by
+                m.message_index asc
+            limit 1));
+
+create index conversation_modified_at on conversation (modified_at, id);
@@ -0,0 +1,12 @@
+-- Per-conversation message index counter, maintained by add_message
+alter table conversation add column next_message_index integer not null default 0;
+
+update
+    conversation
+set
+    next_message_index = coalesce((
+        select
+            max(m.message_index) + 1
+        from message m
+        where
+            m.conversation_id = conversation.id), 0);
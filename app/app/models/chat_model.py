@@ -1,7 +1,9 @@
 # Modified version of app/app/models/chat_model.py
+import base64
+import json
 import uuid
 from pathlib import Path
-from typing import List, Optional, Callable, AsyncContextManager
+from typing import List, Optional, Callable, AsyncContextManager, Tuple
 import aiosqlite
 import logging
 from gibberish import Gibberish
@@ -11,6 +13,21 @@ logger = logging.getLogger(__name__)
 gib = Gibberish()
 
 
+def encode_cursor(modified_at: str, conversation_id: str) -> str:
+    return base64.urlsafe_b64encode(
+        json.dumps([modified_at, conversation_id]).encode()
+    ).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Raises ValueError for a malformed cursor."""
+    try:
+        modified_at, conversation_id = json.loads(base64.urlsafe_b64decode(cursor))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return modified_at, conversation_id
+
+
 class ChatModel:
     def __init__(
         self,
@@ -60,24 +77,58 @@ class ChatModel:
         return conversation
 
     async def add_message(self, conversation_id: str, role: str, content: str) -> None:
+        await self.add_messages(conversation_id, [{"role": role, "content": content}])
+
+    async def add_messages(self, conversation_id: str, messages: List[dict]) -> None:
+        """
+        Append messages ({"role", "content"} dicts) to a conversation, in
+        order, in a single transaction.
+        """
         async with self.connection() as conn:
-            await self.queries.add_message(
-                conn=conn,
-                conversation_id=conversation_id,
-                role=role,
-                content=content,
-            )
+            for message in messages:
+                # The insert takes the write lock before it reads the
+                # conversation's next_message_index, so concurrent writers
+                # can't claim the same index:
+                await self.queries.add_message(
+                    conn=conn,
+                    conversation_id=conversation_id,
+                    role=message["role"],
+                    content=message["content"],
+                )
+                await self.queries.update_conversation_summary(
+                    conn=conn,
+                    conversation_id=conversation_id,
+                    content=message["content"],
+                )
             await conn.commit()
 
-    async def get_conversations_paginated(
-        self, offset: int = 0, page_size: int = 10
-    ) -> List[dict]:
+    async def get_conversations_page(
+        self, cursor: Optional[str] = None, page_size: int = 10
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Return one page of conversations, most recently modified first, and
+        the cursor for the next page (None if this is the last page).
+        """
         async with self.connection() as conn:
             conn.row_factory = aiosqlite.Row
-            rows = await self.queries.get_conversations_with_first_sentence_paginated(
-                conn=conn, offset=offset, page_size=page_size
-            )
-        return [dict(r) for r in rows]
+            if cursor is None:
+                rows = await self.queries.get_conversations_first_page(
+                    conn=conn, page_size=page_size + 1
+                )
+            else:
+                modified_at, conv_id = decode_cursor(cursor)
+                rows = await self.queries.get_conversations_after(
+                    conn=conn,
+                    modified_at=modified_at,
+                    id=conv_id,
+                    page_size=page_size + 1,
+                )
+        conversations = [dict(r) for r in rows[:page_size]]
+        next_cursor = None
+        if len(rows) > page_size:
+            last = conversations[-1]
+            next_cursor = encode_cursor(last["modified_at"], last["id"])
+        return conversations, next_cursor
 
     async def delete_conversation(self, conversation_id: str) -> None:
         async with self.connection() as conn:
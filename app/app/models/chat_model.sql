@@ -1,15 +1,34 @@
 -- name: create_conversation!
-insert into conversation (id, created_at, title)
-    values (:id, current_timestamp, :title);
+insert into conversation (id, created_at, modified_at, title)
+    values (:id, current_timestamp, current_timestamp, :title);
 
 -- name: add_message!
 insert into message (conversation_id, role, message_index, content, created_at)
-    values (:conversation_id, :role, coalesce((
+    values (:conversation_id, :role, (
             select
-                max(message_index) + 1
-            from message
+                next_message_index
+            from conversation
             where
-                conversation_id = :conversation_id), 0), :content, current_timestamp);
+                id = :conversation_id), :content, current_timestamp);
+
+-- name: update_conversation_summary!
+update
+    conversation
+set
+    preview = case when message_count = 0 then
+        case when length(substr(:content, 1, instr (:content || '.', '.') - 1)) > 100 then
+            substr(:content, 1, 100) || '...'
+        else
+            substr(:content, 1, instr (:content || '.', '.') - 1)
+        end
+    else
+        preview
+    end,
+    modified_at = current_timestamp,
+    message_count = message_count + 1,
+    next_message_index = next_message_index + 1
+where
+    id = :conversation_id;
 
 -- name: get_conversation_with_messages
 select
@@ -28,44 +47,38 @@ where
 order by
     m.message_index asc;
 
--- name: get_conversations_with_first_sentence_paginated
+-- name: get_conversations_first_page
 select
-    c.id,
-    c.title,
-    c.created_at,
-    latest.latest_message_time as modified_at,
-    case when length(first_sentence) > 100 then
-        substr(first_sentence, 1, 100) || '...'
-    else
-        first_sentence
-    end as preview
+    id,
+    title,
+    created_at,
+    modified_at,
+    preview
 from
-    conversation c
-    join (
-        select
-            m1.conversation_id,
-            substr(m1.content, 1, instr (m1.content || '.', '.') - 1) as first_sentence
-        from
-            message m1
-        where
-            message_index = (
-                select
-                    min(m2.message_index)
-                from
-                    message m2
-                where
-                    m2.conversation_id = m1.conversation_id)) m on m.conversation_id = c.id
-    join (
-        select
-            conversation_id,
-            max(created_at) as latest_message_time
-        from
-            message
-        group by
-            conversation_id) latest on latest.conversation_id = c.id
+    conversation
+where
+    message_count > 0
+order by
+    modified_at desc,
+    id desc
+limit :page_size;
+
+-- name: get_conversations_after
+select
+    id,
+    title,
+    created_at,
+    modified_at,
+    preview
+from
+    conversation
+where
+    message_count > 0
+    and (modified_at, id) < (:modified_at, :id)
 order by
-    latest.latest_message_time desc
-limit :page_size offset :offset;
+    modified_at desc,
+    id desc
+limit :page_size;
 
 -- name: delete_conversation!
 delete from conversation
@@ -44,6 +44,31 @@ class TmuxSessionChangedEvent(BaseModel):
     active: int
 
 
+class TmuxCwdChangedEvent(BaseModel):
+    type: Literal["tmux_cwd_changed"] = Field("tmux_cwd_changed", frozen=True)
+    session: str
+    path: str  # Working directory of the session's active pane
+
+
+class InstanceStatusEvent(BaseModel):
+    type: Literal["instance_status"] = Field("instance_status", frozen=True)
+    context: str
+    project: str  # Docker Compose project name
+    status: str
+
+
 Event = Annotated[
-    Union[ContextChangedEvent, ContextListEvent], Field(discriminator="type")
+    Union[
+        LogoutEvent,
+        ContextChangedEvent,
+        ContextListEvent,
+        OpenAppEvent,
+        OpenInstancesEvent,
+        OpenURLEvent,
+        ConversationUpdatedEvent,
+        TmuxSessionChangedEvent,
+        TmuxCwdChangedEvent,
+        InstanceStatusEvent,
+    ],
+    Field(discriminator="type"),
 ]
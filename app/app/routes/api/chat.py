@@ -2,7 +2,7 @@ import logging
 from fastapi import APIRouter, Depends, Request, HTTPException, Query
 from fastapi.responses import JSONResponse, StreamingResponse
 import openai
-from typing import AsyncGenerator, Callable
+from typing import AsyncGenerator, Callable, Optional
 import json
 import os
 
@@ -98,12 +98,12 @@ async def handle_tool_call(call, system_config: SystemConfig) -> str:
         return json.dumps(state)
     elif function_name == "set_default_context":
         context_name = arguments["context"]
-        valid_contexts = get_docker_context_names()
+        valid_contexts = await get_docker_context_names()
         if context_name not in valid_contexts:
             msg = f"\n\n❌ Error: '{context_name}' is not a valid Docker context.\nAvailable contexts: {valid_contexts}"
             logger.warning(msg)
             return msg
-        set_default_context(context_name)
+        await set_default_context(context_name)
         await broadcast(ContextChangedEvent(new_context=context_name))
         logger.info(f"Switched Docker context to: {context_name}")
         return f"\n\n✅ Switched context to '{context_name}'"
@@ -114,7 +114,7 @@ async def handle_tool_call(call, system_config: SystemConfig) -> str:
         instance = arguments["instance"]
         try:
             command = [DRY_COMMAND, "make", project, action, f"instance={instance}"]
-            run_command(command)
+            await run_command(command)
             msg = f"\n\n✅ Successfully ran: {' '.join(command)}"
             logger.info(msg.strip())
             return msg
@@ -287,15 +287,17 @@ async def stream_chat(
 
 @router.get("/conversations")
 async def conversation_previews(
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None),
     page_size: int = Query(10, ge=1, le=100),
     chat_model: ChatModel = Depends(get_chat_model),
 ):
-    offset = (page - 1) * page_size
-    conversations = await chat_model.get_conversations_paginated(
-        offset=offset, page_size=page_size
-    )
-    return {"page": page, "conversations": conversations}
+    try:
+        conversations, next_cursor = await chat_model.get_conversations_page(
+            cursor=cursor, page_size=page_size
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"conversations": conversations, "next_cursor": next_cursor}
 
 
 @router.get("/conversation/{id}")
@@ -18,9 +18,9 @@ class ConfigError(Exception):
     pass
 
 
-def get_root_config(context: str = None):
+async def get_root_config(context: str = None):
     if not context:
-        context = run_command(["docker", "context", "show"])
+        context = await run_command(["docker", "context", "show"])
     config_path = os.path.join(DRY_PATH, f".env_{context}")
     if os.path.isfile(config_path):
         with open(config_path) as f:
@@ -34,9 +34,9 @@ def get_root_config(context: str = None):
 @router.get("/config", response_class=JSONResponse)
 async def config(context: str = None):
     if not context:
-        context = run_command(["docker", "context", "show"])
+        context = await run_command(["docker", "context", "show"])
     try:
-        return get_root_config(context)
+        return await get_root_config(context)
     except ConfigError:
         raise HTTPException(
             status_code=404,
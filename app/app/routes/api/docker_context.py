@@ -3,6 +3,10 @@ from typing import List
 from fastapi import APIRouter, HTTPException
 import json
 from .lib import run_command
+from app.lib.instance_status import forget_context
+from app.lib.docker_context_watcher import get_context_names_from_meta
+from app.broadcast import broadcast
+from app.models.events import ContextListEvent
 
 # Import the parse_ssh_config from the sibling module.
 from .ssh_config import parse_ssh_config
@@ -10,38 +14,38 @@ from .ssh_config import parse_ssh_config
 router = APIRouter(prefix="/api/docker_context", tags=["docker_context"])
 
 
-def get_docker_context() -> str:
-    return run_command(["docker", "context", "show"])
+async def get_docker_context() -> str:
+    return await run_command(["docker", "context", "show"])
 
 
-def get_docker_context_names() -> List[str]:
+async def get_docker_context_names() -> List[str]:
     """
     Retrieve a list of existing docker context names.
     """
-    output = run_command(["docker", "context", "ls", "--format", "{{.Name}}"])
-    # Each line represents a context name.
-    if output:
-        return [name for name in output.splitlines() if name != "default"]
-    return []
+    return get_context_names_from_meta()
+
+
+async def broadcast_context_list():
+    await broadcast(ContextListEvent(contexts=await get_docker_context_names()))
 
 
 @router.get("/", response_model=List[str])
-def get_all_contexts():
+async def get_all_contexts():
     """
     Retrieve all docker contexts using the docker CLI.
     """
-    contexts = get_docker_context_names()
+    contexts = await get_docker_context_names()
     return contexts
 
 
 @router.post("/", response_model=dict)
-def create_context(context_name: str):
+async def create_context(context_name: str):
     """
     Create a new docker context using docker CLI commands.
     Validates that the context does not already exist and that the SSH config entry exists.
     """
     # Check if the context already exists.
-    if context_name in get_docker_context_names():
+    if context_name in await get_docker_context_names():
         raise HTTPException(status_code=400, detail="Context already exists.")
 
     # Validate SSH config entry.
@@ -71,53 +75,56 @@ def create_context(context_name: str):
         "--docker",
         f"host=ssh://{context_name}",
     ]
-    run_command(cmd)
+    await run_command(cmd)
+    await broadcast_context_list()
     return {"detail": f"Context '{context_name}' created successfully."}
 
 
 @router.delete("/{context_name}", response_model=dict)
-def delete_context(context_name: str):
+async def delete_context(context_name: str):
     """
     _    Delete an existing docker context using the docker CLI.
     """
     # Check if the context exists.
-    if context_name not in get_docker_context_names():
+    if context_name not in await get_docker_context_names():
         raise HTTPException(status_code=404, detail="Context not found.")
 
     cmd = ["docker", "context", "rm", "-f", context_name]
-    run_command(cmd)
+    await run_command(cmd)
+    forget_context(context_name)
+    await broadcast_context_list()
     return {"detail": f"Context '{context_name}' deleted successfully."}
 
 
 @router.put("/{context_name}/default", response_model=dict)
-def set_default_context(context_name: str):
+async def set_default_context(context_name: str):
     """
     Set an existing docker context as the default using the docker CLI.
     """
-    if context_name not in get_docker_context_names():
+    if context_name not in await get_docker_context_names():
         raise HTTPException(status_code=404, detail="Context not found.")
 
     cmd = ["docker", "context", "use", context_name]
-    run_command(cmd)
+    await run_command(cmd)
     return {"detail": f"Context '{context_name}' set as default."}
 
 
 @router.get("/default", response_model=dict)
-def get_default_context():
+async def get_default_context():
     """
     Retrieve the current default docker context using the docker CLI.
     """
-    default_context = get_docker_context()
+    default_context = await get_docker_context()
     return {"default_context": default_context}
 
 
-def get_context_from_docker_info_json_for_context(context_name: str) -> str:
+async def get_context_from_docker_info_json_for_context(context_name: str) -> str:
     """
     Call `docker info` with JSON formatting using the specified context.
     Uses a timeout of 5 seconds for the command.
     The JSON output is expected to contain a 'ClientInfo' key with a nested 'Context' key.
     """
-    json_output = run_command(
+    json_output = await run_command(
         ["docker", "--context", context_name, "info", "--format", "{{json .}}"],
         timeout=5,
     )
@@ -146,7 +153,7 @@ def get_context_from_docker_info_json_for_context(context_name: str) -> str:
 
 
 @router.get("/test/{context_name}", response_model=dict)
-def test_docker_context(context_name: str):
+async def test_docker_context(context_name: str):
     """
     Test that the specified docker context is working by calling `docker info`
     with JSON formatting using the user-specified context.
@@ -154,8 +161,8 @@ def test_docker_context(context_name: str):
     This call will timeout after 5 seconds if docker info does not return in time.
     """
     # Check if the context exists.
-    if context_name not in get_docker_context_names():
+    if context_name not in await get_docker_context_names():
         raise HTTPException(status_code=404, detail="Context not found.")
 
-    current_context = get_context_from_docker_info_json_for_context(context_name)
+    current_context = await get_context_from_docker_info_json_for_context(context_name)
     return {"docker_context": current_context}
@@ -1,4 +1,5 @@
 from app.routes import *
+from app.routes import api as api_routes
 from .lib import (
     ensure_ends_with_punctuation,
     parse_env_file_contents,
@@ -64,5 +65,5 @@ async def get_env_dist_data(app: str) -> dict:
 
 @router.get("/")
 async def get_env_dist(app: str):
-    data = await get_env_dist_data(app)
+    data = await api_routes.project_catalog.catalog.get_env_dist(app)
     return JSONResponse(data)
@@ -4,10 +4,23 @@ Broadcast server events to all connected clients
 
 from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
-from app.broadcast import subscribe, unsubscribe
+from app.broadcast import (
+    subscribe,
+    unsubscribe,
+    update_state,
+    get_state,
+    replay,
+    snapshot,
+    resume_frame,
+    stats,
+    SubscriberClosed,
+)
+import asyncio
 import logging
+import os
+from typing import Optional
 from .docker_context import get_docker_context, get_docker_context_names
-from app.models.events import Event, ContextChangedEvent, ContextListEvent
+from app.models.events import ContextChangedEvent, ContextListEvent
 
 router = APIRouter()
 
@@ -15,35 +28,76 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/events", tags=["events"])
 
+# Send an SSE comment this often on an idle stream, so that proxies keep the
+# connection open and a dead client is noticed:
+HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+HEARTBEAT_FRAME = b": heartbeat\n\n"
+
+
+_seeding: Optional[asyncio.Task] = None
+
+
+async def _seed_context_state():
+    if get_state("context_changed") is None:
+        update_state(ContextChangedEvent(new_context=await get_docker_context()))
+    if get_state("context_list") is None:
+        update_state(ContextListEvent(contexts=await get_docker_context_names()))
+
+
+async def seed_context_state():
+    """
+    Fill in the Docker context state from the CLI, if the watchers haven't
+    provided it yet. Concurrent callers share a single run, so that a burst
+    of reconnecting clients starts at most one set of docker commands.
+    """
+    global _seeding
+    if get_state("context_changed") and get_state("context_list"):
+        return
+    if _seeding is None or _seeding.done():
+        _seeding = asyncio.create_task(_seed_context_state())
+    await asyncio.shield(_seeding)
+
 
 @router.get("/")
 async def sse(request: Request):
+    last_event_id = request.headers.get("last-event-id")
+    missed = replay(last_event_id) if last_event_id else None
+    if missed is None:
+        await seed_context_state()
+
+    # Nothing is awaited from here on until the stream starts, so the
+    # initial frames and the queue neither overlap nor leave a gap:
     queue = await subscribe()
+    if missed is None:
+        # New client, or one too far behind to replay: send the current state.
+        initial = [message.frame for message in snapshot()] + [resume_frame()]
+    else:
+        initial = [message.frame for message in replay(last_event_id)]
 
-    # Send initial events upon connection:
-    # - current docker context
-    # - list of docker contexts
-    await queue.put(
-        ContextChangedEvent(
-            new_context=get_docker_context(),
-        )
-    )
-    await queue.put(
-        ContextListEvent(
-            contexts=get_docker_context_names(),
-        )
-    )
+    async def close_on_disconnect():
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+        queue.close()
 
     async def event_stream():
+        disconnect_watcher = asyncio.create_task(close_on_disconnect())
         try:
+            for frame in initial:
+                yield frame
             while True:
-                # disconnect detection
-                if await request.is_disconnected():
-                    break
-
-                event: Event = await queue.get()
-                yield f"event: {event.type}\ndata: {event.model_dump_json()}\n\n"
+                message = await queue.get(timeout=HEARTBEAT_INTERVAL)
+                yield message.frame if message is not None else HEARTBEAT_FRAME
+        except SubscriberClosed:
+            if not disconnect_watcher.done():
+                logger.warning("Disconnecting slow event stream subscriber")
         finally:
+            disconnect_watcher.cancel()
             unsubscribe(queue)
 
     return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@router.get("/stats")
+async def sse_stats():
+    """Live subscriber count and broadcaster counters."""
+    return stats()
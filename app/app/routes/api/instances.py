@@ -8,11 +8,12 @@ from pathlib import Path
 from collections import defaultdict
 from pydantic import BaseModel
 from typing import Optional
-from .lib import run_command, run_command_status, parse_env_file_contents
+from .lib import run_command, parse_env_file_contents
 from .docker_context import get_docker_context_names
+from .project_catalog import catalog
 import json
 import asyncio
-from app.lib.json import wrap_json_lines_as_list
+from app.lib.instance_status import get_context_projects, determine_project_status
 
 """
 Manage app instances.
@@ -35,7 +36,7 @@ class Instance(BaseModel):
         json_encoders = {Path: lambda v: str(v)}
 
 
-def get_instances(
+async def get_instances(
     include_status: bool = False,
     context: str | None = None,
     app: str | None = None,
@@ -78,65 +79,54 @@ def get_instances(
                 except KeyError:
                     traefik_host = None
 
-            if include_status:
-                try:
-                    status_command = [
-                        DRY_COMMAND,
-                        "make",
-                        app_name,
-                        "docker-compose-lifecycle-cmd",
-                        "EXTRA_ARGS=ps -a --format json",
-                        "instance=" + instance_name,
-                    ]
-                    status_output = run_command(status_command)
-                    status_json = wrap_json_lines_as_list(status_output)
-                except HTTPException:
-                    status = "uninstalled"
-                except json.JSONDecodeError as e:
-                    if status_output.strip() == "":
-                        status = "uninstalled"
-                    else:
-                        status = "error"
-                        logger.error(e)
-                else:
-                    status = determine_project_status(status_json)
-            else:
-                status = None
-
             instance_obj = Instance(
                 app=app_name,
                 env_path=env_file,
                 context=file_context,
                 instance=instance_name,
                 traefik_host=traefik_host,
-                status=status,
+                status=None,
             )
 
             instances.append(instance_obj)
 
+    if include_status:
+        await apply_instance_status(instances)
+
     return instances
 
 
-def determine_project_status(container_list: list[dict]) -> str:
+def compose_project_name(app: str, instance: str) -> str:
+    """
+    The Docker Compose project name d.rymcg.tech uses for an instance:
+    the default instance is named after the app, others are `{app}_{instance}`.
     """
-    Determines the status of a project by inspecting the 'State' of containers,
-    ignoring those with Service == 'config'.
+    name = app if instance == "default" else f"{app}_{instance}"
+    return name.lower()
 
-    Parameters:
-    - container_list: a list of container JSON objects (already parsed from JSON)
 
-    Returns:
-    - The uniform 'State' if all non-config services share it,
-      'error' if states differ,
-      or 'unknown' if no applicable services exist.
+async def apply_instance_status(instances: list[Instance]):
     """
-    states = {c["State"] for c in container_list if c.get("Service") != "config"}
+    Set the status of every instance from the per-context status cache,
+    no matter how many instances there are.
+    """
+    contexts = sorted({i.context for i in instances})
+    snapshots = await asyncio.gather(
+        *(get_context_projects(c) for c in contexts), return_exceptions=True
+    )
+    snapshots = dict(zip(contexts, snapshots))
 
-    if not states:
-        return "unknown"
-    if len(states) == 1:
-        return states.pop()
-    return "error"
+    for instance in instances:
+        snapshot = snapshots[instance.context]
+        if isinstance(snapshot, Exception):
+            logger.error(f"Could not get status for {instance.context}: {snapshot}")
+            instance.status = "error"
+            continue
+        containers = snapshot.get(compose_project_name(instance.app, instance.instance))
+        if containers:
+            instance.status = determine_project_status(containers)
+        else:
+            instance.status = "uninstalled"
 
 
 @router.get("/", response_class=JSONResponse)
@@ -146,16 +136,16 @@ async def get_app_instances(
     include_status: Optional[bool] = Query(default=False),
 ):
     if context is None:
-        context = run_command(["docker", "context", "show"]).strip()
+        context = (await run_command(["docker", "context", "show"])).strip()
     else:
-        if context not in get_docker_context_names():
+        if context not in await get_docker_context_names():
             return JSONResponse(
                 content={"message": f"Context not found: {context}"}, status_code=404
             )
 
     instances = defaultdict(list)
 
-    for instance in get_instances(
+    for instance in await get_instances(
         include_status=include_status, context=context, app=app
     ):
         instances[instance.app].append(json.loads(instance.json()))
@@ -173,7 +163,7 @@ async def save_instance_config(
     if not app or not context:
         raise HTTPException(status_code=400, detail="Missing 'app' or 'context'")
 
-    data = await api_routes.env_dist.get_env_dist_data(app)
+    data = await catalog.get_env_dist(app)
     prefix = data["meta"]["PREFIX"]
 
     # Parse {APP}_INSTANCE from .env posted to get the instance name
@@ -1,4 +1,3 @@
-import subprocess
 from typing import List, Optional
 from fastapi import HTTPException
 import string
@@ -7,11 +6,12 @@ import re
 import yaml
 from typing import Iterator
 import logging
+from app.lib.executor import executor, CommandFailed, CommandTimeout
 
 logger = logging.getLogger(__name__)
 
 
-def run_command(
+async def run_command(
     cmd: List[str], timeout: Optional[int] = None, allow_failure: bool = False
 ) -> str:
     """
@@ -24,21 +24,14 @@ def run_command(
     """
     try:
         logging.info(f"run_command: {cmd}")
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True,
-            text=True,
-            timeout=timeout,
-        )
+        result = await executor.run(cmd, timeout=timeout)
         return result.stdout.strip()
-    except subprocess.TimeoutExpired:
+    except CommandTimeout:
         raise HTTPException(
             status_code=504,
             detail=f"Command '{' '.join(cmd)}' timed out after {timeout} seconds.",
         )
-    except subprocess.CalledProcessError as e:
+    except CommandFailed as e:
         if allow_failure:
             # Return stdout if available, otherwise return stderr.
             return e.stdout.strip() or e.stderr.strip()
@@ -48,7 +41,7 @@ def run_command(
         )
 
 
-def run_command_status(cmd: List[str], timeout: Optional[int] = None) -> int:
+async def run_command_status(cmd: List[str], timeout: Optional[int] = None) -> int:
     """
     Run a shell command, discarding all output.
 
@@ -56,14 +49,9 @@ def run_command_status(cmd: List[str], timeout: Optional[int] = None) -> int:
     If the command times out, returns -1.
     """
     try:
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            timeout=timeout,
-        )
+        result = await executor.run(cmd, timeout=timeout, check=False)
         return result.returncode
-    except subprocess.TimeoutExpired:
+    except CommandTimeout:
         return -1
 
 
@@ -0,0 +1,352 @@
+from app.routes import DRY_COMMAND, DRY_PATH
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Optional
+from fastapi import HTTPException
+from .env_dist import get_env_dist_data
+from .lib import parse_docker_compose_services, run_command
+from app.lib.executor import executor
+
+"""
+Catalog of the d.rymcg.tech projects.
+
+Parsing the project list, the README descriptions, and every project's
+.env-dist, Makefile and docker-compose.yaml is slow, and the result only
+changes when the repository does. The catalog is keyed on the git HEAD
+commit plus the mtimes of any dirty files, persisted to disk, and served
+from memory. refresh() re-parses only the projects whose files changed.
+Reads check the repository again at most every CATALOG_CHECK_INTERVAL
+seconds, so that local edits show up without a pull or a restart.
+"""
+
+logger = logging.getLogger("uvicorn.error")
+
+CATALOG_PATH = Path(os.getenv("HOME")) / "dry_agent" / "cache" / "project_catalog.json"
+CATALOG_VERSION = 1
+# Minimum seconds between checks of the repository for changes on read:
+CATALOG_CHECK_INTERVAL = 2.0
+
+
+def parse_readme_descriptions():
+    readme_path = os.path.join(DRY_PATH, "README.md")
+
+    if not os.path.exists(readme_path):
+        return {}
+
+    projects_with_descriptions = {}
+
+    try:
+        with open(readme_path, "r", encoding="utf-8") as file:
+            lines = file.readlines()
+
+        inside_section = False
+        current_app = None
+        expecting_description = False
+
+        for line in lines:
+            line = line.strip()
+
+            if (
+                "Install these first" in line
+                or "Install these recommended backbone applications next:" in line
+                or "Install these other services" in line
+            ):
+                inside_section = True
+                continue
+
+            if inside_section:
+                match = re.match(
+                    r"\*\s+\[(.*?)\]\((.*?)#readme\)\s*(?:-\s*(.*))?", line
+                )
+
+                if match:
+                    display_name, link_name, description = match.groups()
+                    link_name = link_name.strip().lower()
+
+                    if description:
+                        projects_with_descriptions[link_name] = description.strip()
+                        current_app = None
+                    else:
+                        current_app = link_name
+                        expecting_description = True
+                    continue
+
+                if current_app and expecting_description and line.startswith("*"):
+                    projects_with_descriptions[current_app] = line.lstrip("*- ").strip()
+                    current_app = None
+                    expecting_description = False
+
+    except Exception as e:
+        logger.warning(f"Error reading README.md: {e}")
+
+    return projects_with_descriptions
+
+
+def parse_app_services(app: str) -> dict:
+    """
+    Parse the service names from an app's docker-compose.yaml, returning
+    either {"services": [...]} or {"error": {"status_code", "detail"}}.
+    """
+    docker_compose_path = os.path.join(DRY_PATH, app, "docker-compose.yaml")
+    if not os.path.isfile(docker_compose_path):
+        return {
+            "error": {
+                "status_code": 404,
+                "detail": f"Could not find docker-compose.yaml for app: {app}",
+            }
+        }
+    with open(docker_compose_path) as f:
+        docker_compose_content = f.read()
+    try:
+        return {"services": parse_docker_compose_services(docker_compose_content)}
+    except ValueError:
+        return {
+            "error": {
+                "status_code": 500,
+                "detail": f"Could not parse: {docker_compose_path}",
+            }
+        }
+
+
+async def build_entry(app: str) -> dict:
+    try:
+        env_dist = {"env_dist": await get_env_dist_data(app)}
+    except HTTPException as e:
+        env_dist = {"error": {"status_code": e.status_code, "detail": e.detail}}
+    return {"env_dist": env_dist, "services": parse_app_services(app)}
+
+
+async def get_git_head() -> str:
+    return await run_command(["git", "-C", DRY_PATH, "rev-parse", "HEAD"])
+
+
+async def get_dirty_files() -> dict[str, Optional[float]]:
+    """
+    Return the working tree files that differ from HEAD, with their mtimes
+    (None for deleted files).
+    """
+    # Not run_command, which would strip the leading status column:
+    result = await executor.run(
+        ["git", "-C", DRY_PATH, "status", "--porcelain=v1", "-z"]
+    )
+    dirty = {}
+    entries = iter(result.stdout.split("\0"))
+    for entry in entries:
+        if len(entry) < 4:
+            continue
+        status, path = entry[:2], entry[3:]
+        if "R" in status or "C" in status:
+            # Renames and copies are followed by the original path:
+            dirty[next(entries, "")] = None
+        try:
+            dirty[path] = os.stat(os.path.join(DRY_PATH, path)).st_mtime
+        except OSError:
+            dirty[path] = None
+    dirty.pop("", None)
+    return dirty
+
+
+async def get_changed_paths(old_head: str, new_head: str) -> Optional[set[str]]:
+    """Paths changed between two commits, or None if git can't tell us."""
+    try:
+        output = await run_command(
+            ["git", "-C", DRY_PATH, "diff", "--name-only", old_head, new_head]
+        )
+    except HTTPException:
+        return None
+    return set(output.splitlines())
+
+
+async def list_projects() -> list[str]:
+    output = await run_command([DRY_COMMAND, "list"])
+    lines = output.splitlines()
+    service_lines = lines[1:]  # skip header
+    projects = []
+    for line in service_lines:
+        projects.extend(line.strip().split())
+    return sorted(projects)
+
+
+class ProjectCatalog:
+    def __init__(self, path: Path = CATALOG_PATH):
+        self.path = path
+        self.data: Optional[dict] = None
+        self.available: list[dict] = []
+        self._lock = asyncio.Lock()
+        # (inode, mtime) of the file self.data was last loaded from or saved
+        # to, for noticing refreshes made by other workers:
+        self._file_id = None
+        # time.monotonic() of the last check of the repository:
+        self._checked = 0.0
+
+    def _stat_file_id(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def load(self) -> Optional[dict]:
+        file_id = self._stat_file_id()
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if data.get("version") != CATALOG_VERSION:
+            return None
+        self._file_id = file_id
+        return data
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+        self._file_id = self._stat_file_id()
+
+    def _reload_if_changed(self):
+        """Pick up a catalog saved by another worker since we last looked."""
+        if self.data is None or self._lock.locked():
+            return
+        if self._stat_file_id() == self._file_id:
+            return
+        data = self.load()
+        if data is not None:
+            self._set(data)
+
+    async def refresh(self):
+        """
+        Bring the catalog up to date with the repository, re-parsing only the
+        projects whose files changed since the catalog was built.
+        """
+        async with self._lock:
+            self._checked = time.monotonic()
+            head = await get_git_head()
+            dirty = await get_dirty_files()
+            old = self.data or self.load()
+            if old and old["head"] == head and old["dirty"] == dirty:
+                if self.data is None:
+                    self._set(old)
+                return
+
+            changed = None
+            if old is not None:
+                changed = {
+                    path
+                    for path in set(dirty) | set(old["dirty"])
+                    if dirty.get(path) != old["dirty"].get(path)
+                }
+                if old["head"] != head:
+                    diff = await get_changed_paths(old["head"], head)
+                    changed = None if diff is None else changed | diff
+
+            if changed is None:
+                logger.info(f"Building project catalog at {head}")
+                names = await list_projects()
+                projects = {}
+                descriptions = parse_readme_descriptions()
+            else:
+                logger.info(f"Updating project catalog for {len(changed)} paths")
+                names = await list_projects() if old["head"] != head else old["names"]
+                projects = {
+                    name: entry
+                    for name, entry in old["projects"].items()
+                    if name not in {p.split("/", 1)[0] for p in changed}
+                }
+                descriptions = (
+                    parse_readme_descriptions()
+                    if "README.md" in changed
+                    else old["descriptions"]
+                )
+
+            for name in names:
+                if name not in projects:
+                    projects[name] = await build_entry(name)
+
+            self._set(
+                {
+                    "version": CATALOG_VERSION,
+                    "head": head,
+                    "dirty": dirty,
+                    "names": names,
+                    "descriptions": descriptions,
+                    "projects": {name: projects[name] for name in names},
+                }
+            )
+            await asyncio.to_thread(self.save)
+
+    def _set(self, data: dict):
+        self.data = data
+        available = []
+        for name in data["names"]:
+            error = data["projects"][name]["env_dist"].get("error")
+            if error:
+                # Only include if instantiable
+                if error["status_code"] != 404:
+                    logger.error(f"Could not load project {name}: {error['detail']}")
+                continue
+            available.append(
+                {
+                    "name": name,
+                    "description": data["descriptions"].get(
+                        name, "No description available"
+                    ),
+                }
+            )
+        self.available = available
+
+    async def _ensure_current(self):
+        """
+        Load the catalog on first use, and otherwise refresh it if the last
+        check is more than CATALOG_CHECK_INTERVAL old. The refresh is only a
+        git rev-parse and git status when nothing changed.
+        """
+        self._reload_if_changed()
+        if self.data is None:
+            await self.refresh()
+            return
+        if self._lock.locked():
+            # Being refreshed already:
+            return
+        if time.monotonic() - self._checked < CATALOG_CHECK_INTERVAL:
+            return
+        try:
+            await self.refresh()
+        except Exception:
+            # Serve the catalog we have:
+            logger.exception("Failed to refresh the project catalog")
+
+    async def get_entry(self, app: str) -> Optional[dict]:
+        await self._ensure_current()
+        return self.data["projects"].get(app)
+
+    async def get_available_projects(self) -> list[dict]:
+        await self._ensure_current()
+        return self.available
+
+    async def get_env_dist(self, app: str) -> dict:
+        entry = await self.get_entry(app)
+        if entry is None:
+            # Not a listed project, so not cached:
+            return await get_env_dist_data(app)
+        env_dist = entry["env_dist"]
+        if "error" in env_dist:
+            raise HTTPException(**env_dist["error"])
+        return env_dist["env_dist"]
+
+    async def get_services(self, app: str) -> dict:
+        """Returns {"services": [...]} or {"error": {"status_code", "detail"}}."""
+        entry = await self.get_entry(app)
+        if entry is None:
+            return parse_app_services(app)
+        return entry["services"]
+
+
+catalog = ProjectCatalog()
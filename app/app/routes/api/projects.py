@@ -1,15 +1,14 @@
-from app.routes import DRY_COMMAND, DRY_PATH
-from app.routes import api as api_routes
 import logging
-import os
-import re
 import traceback
-import subprocess
 from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import JSONResponse
-from .lib import parse_docker_compose_services, run_command
-from starlette.concurrency import run_in_threadpool
-import json
+from .lib import run_command
+from .project_catalog import catalog
+from app.lib.instance_status import (
+    get_context_projects,
+    determine_project_status,
+    WatcherError,
+)
 
 """
 General information about available projects and default configs.
@@ -21,79 +20,32 @@ router = APIRouter(prefix="/api/projects", tags=["projects"])
 
 
 async def get_available_projects():
-    command = [DRY_COMMAND, "list"]
-
     try:
-        result = subprocess.run(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            check=True,
-        )
-
-        lines = result.stdout.strip().splitlines()
-        service_lines = lines[1:]  # skip header
-        projects = []
-        for line in service_lines:
-            projects.extend(line.strip().split())
-
-        descriptions = parse_readme_descriptions()
-        app_data = []
-
-        for app in sorted(projects):
-            try:
-                # Only include if instantiable
-                await api_routes.env_dist.get_env_dist_data(app)
-                app_data.append(
-                    {
-                        "name": app,
-                        "description": descriptions.get(
-                            app, "No description available"
-                        ),
-                    }
-                )
-            except HTTPException as e:
-                if e.status_code == 404:
-                    continue  # skip non-instantiable
-                else:
-                    raise
-
-        return app_data
-
+        return await catalog.get_available_projects()
     except Exception:
         logger.error("Failed to load available projects:\n%s", traceback.format_exc())
         raise
 
 
-async def get_projects_status() -> dict:
-    cmd = [
-        DRY_COMMAND,
-        "make",
-        "-",
-        "status-json",
-    ]
-
+async def get_projects_status() -> list:
+    """
+    Status of every Docker Compose project on the current context, served
+    from the instance status cache.
+    """
+    context = await run_command(["docker", "context", "show"])
     try:
-        # run_command is sync, so push it into a thread
-        raw = await run_in_threadpool(run_command, cmd)
-    except HTTPException:
-        # propagate any HTTPExceptions from run_command
-        raise
-    except Exception as e:
-        # catch/unexpected fallback
+        projects = await get_context_projects(context)
+    except WatcherError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    try:
-        data = json.loads(raw)
-        for i in data:
-            if i.get("Status", "").startswith("running"):
-                i["Status"] = "running"
-        return data
-    except json.JSONDecodeError as e:
-        raise HTTPException(
-            status_code=500, detail=f"Command output was not valid JSON: {e.msg}"
-        )
+    return [
+        {
+            "Name": name,
+            "Status": determine_project_status(containers),
+            "ConfigFiles": containers[0]["ConfigFiles"],
+        }
+        for name, containers in sorted(projects.items())
+    ]
 
 
 @router.get("/available/")
@@ -110,74 +62,10 @@ async def get_projects_available():
 
 @router.get("/services/", response_class=JSONResponse)
 async def get_app_services(app: str = Query()):
-    docker_compose_path = os.path.join(DRY_PATH, app, "docker-compose.yaml")
-    if not os.path.isfile(docker_compose_path):
-        return JSONResponse(
-            status_code=404,
-            content={"detail": f"Could not find docker-compose.yaml for app: {app}"},
-        )
-    with open(docker_compose_path) as f:
-        docker_compose_content = f.read()
-    try:
-        services = parse_docker_compose_services(docker_compose_content)
-    except ValueError:
+    result = await catalog.get_services(app)
+    if "error" in result:
         return JSONResponse(
-            status_code=500,
-            content={"detail": f"Could not parse: {docker_compose_path}"},
+            status_code=result["error"]["status_code"],
+            content={"detail": result["error"]["detail"]},
         )
-    return {"app": app, "services": services}
-
-
-def parse_readme_descriptions():
-    readme_path = os.path.join(DRY_PATH, "README.md")
-
-    if not os.path.exists(readme_path):
-        return {}
-
-    projects_with_descriptions = {}
-
-    try:
-        with open(readme_path, "r", encoding="utf-8") as file:
-            lines = file.readlines()
-
-        inside_section = False
-        current_app = None
-        expecting_description = False
-
-        for line in lines:
-            line = line.strip()
-
-            if (
-                "Install these first" in line
-                or "Install these recommended backbone applications next:" in line
-                or "Install these other services" in line
-            ):
-                inside_section = True
-                continue
-
-            if inside_section:
-                match = re.match(
-                    r"\*\s+\[(.*?)\]\((.*?)#readme\)\s*(?:-\s*(.*))?", line
-                )
-
-                if match:
-                    display_name, link_name, description = match.groups()
-                    link_name = link_name.strip().lower()
-
-                    if description:
-                        projects_with_descriptions[link_name] = description.strip()
-                        current_app = None
-                    else:
-                        current_app = link_name
-                        expecting_description = True
-                    continue
-
-                if current_app and expecting_description and line.startswith("*"):
-                    projects_with_descriptions[current_app] = line.lstrip("*- ").strip()
-                    current_app = None
-                    expecting_description = False
-
-    except Exception as e:
-        print(f"Error reading README.md: {e}")
-
-    return projects_with_descriptions
+    return {"app": app, "services": result["services"]}
@@ -1,18 +1,34 @@
+import logging
 from fastapi import APIRouter, HTTPException, Form
 from fastapi.responses import JSONResponse
 from typing import List
 
 from app.routes import DRY_PATH
 from .lib import run_command
+from .project_catalog import catalog
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 router = APIRouter(prefix="/api/repo", tags=["repository"])
 
 
+async def refresh_catalog():
+    """
+    Rebuild the project catalog after the checkout may have changed. The git
+    command has already run by then, so a failure is logged, not returned.
+    """
+    try:
+        await catalog.refresh()
+    except Exception:
+        logger.exception("Failed to refresh the project catalog")
+
+
 @router.post("/pull", response_class=JSONResponse)
 async def pull_repo():
     command = ["git", "-C", DRY_PATH, "pull"]
-    output = run_command(command, allow_failure=True)
+    output = await run_command(command, allow_failure=True)
+    await refresh_catalog()
     return {
         "status": "success" if not output.startswith("fatal:") else "error",
         "command": " ".join(command),
@@ -23,8 +39,8 @@ async def pull_repo():
 @router.get("/branches", response_class=JSONResponse)
 async def list_branches():
     try:
-        branches = get_git_branches(DRY_PATH)
-        current_branch = get_current_git_branch(DRY_PATH)
+        branches = await get_git_branches(DRY_PATH)
+        current_branch = await get_current_git_branch(DRY_PATH)
         return {
             "status": "success",
             "branches": branches,
@@ -37,7 +53,8 @@ async def list_branches():
 @router.post("/checkout", response_class=JSONResponse)
 async def checkout_branch(branch: str = Form(...)):
     command = ["git", "-C", DRY_PATH, "checkout", branch]
-    output = run_command(command, allow_failure=True)
+    output = await run_command(command, allow_failure=True)
+    await refresh_catalog()
     return {
         "status": "success" if "error" not in output.lower() else "error",
         "command": " ".join(command),
@@ -45,9 +62,9 @@ async def checkout_branch(branch: str = Form(...)):
     }
 
 
-def get_git_branches(repo_path: str) -> List[str]:
+async def get_git_branches(repo_path: str) -> List[str]:
     command = ["git", "-C", repo_path, "branch", "-a", "--format=%(refname:short)"]
-    output = run_command(command)
+    output = await run_command(command)
     raw_branches = output.strip().splitlines()
 
     branches = set()
@@ -62,20 +79,22 @@ def get_git_branches(repo_path: str) -> List[str]:
     return sorted(branches)
 
 
-def get_current_git_branch(repo_path: str) -> str:
+async def get_current_git_branch(repo_path: str) -> str:
     try:
         # Try to get the current symbolic branch
-        return run_command(["git", "-C", repo_path, "symbolic-ref", "--short", "HEAD"])
+        return await run_command(
+            ["git", "-C", repo_path, "symbolic-ref", "--short", "HEAD"]
+        )
     except HTTPException:
         pass  # Continue to fallback for detached HEAD
 
     try:
         # Detached HEAD: get short commit hash
-        short_commit = run_command(
+        short_commit = await run_command(
             ["git", "-C", repo_path, "rev-parse", "--short", "HEAD"]
         )
 
-        remotes_output = run_command(
+        remotes_output = await run_command(
             ["git", "-C", repo_path, "branch", "-r", "--contains", short_commit],
             allow_failure=True,
         )
@@ -93,27 +112,27 @@ def get_current_git_branch(repo_path: str) -> str:
 async def fetch_status():
     try:
         # Fetch latest from remote
-        run_command(["git", "-C", DRY_PATH, "fetch", "--prune"])
+        await run_command(["git", "-C", DRY_PATH, "fetch", "--prune"])
 
         detached = False
 
         # Try to get current branch name (symbolic ref)
         try:
-            current_branch = run_command(
+            current_branch = await run_command(
                 ["git", "-C", DRY_PATH, "symbolic-ref", "--short", "HEAD"]
             )
         except HTTPException:
             # Detached HEAD — fallback to commit hash
             detached = True
-            current_branch = run_command(
+            current_branch = await run_command(
                 ["git", "-C", DRY_PATH, "rev-parse", "--short", "HEAD"]
             )
 
         # Get local HEAD commit hash
-        local_head = run_command(["git", "-C", DRY_PATH, "rev-parse", "HEAD"])
+        local_head = await run_command(["git", "-C", DRY_PATH, "rev-parse", "HEAD"])
 
         # Try to determine matching remote branch
-        remotes_output = run_command(
+        remotes_output = await run_command(
             ["git", "-C", DRY_PATH, "branch", "-r", "--contains", local_head],
             allow_failure=True,
         )
@@ -136,7 +155,7 @@ async def fetch_status():
             )
             remote_head = "(unknown)"
         else:
-            remote_head = run_command(
+            remote_head = await run_command(
                 ["git", "-C", DRY_PATH, "rev-parse", remote_branch]
             )
 
@@ -147,7 +166,7 @@ async def fetch_status():
                     else f"{current_branch} is up to date with {remote_branch}."
                 )
             else:
-                behind_count = run_command(
+                behind_count = await run_command(
                     [
                         "git",
                         "-C",
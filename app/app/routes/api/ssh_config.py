@@ -194,7 +194,7 @@ async def create_or_update_ssh_config_entry(entry: SSHConfigEntry, request: Requ
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def test_ssh_connection(host: str) -> str:
+async def test_ssh_connection(host: str) -> str:
     """
     Test SSH connection to the given host alias by verifying that the output of
     "ssh {host} whoami" matches the configured username in the SSH config file.
@@ -236,7 +236,7 @@ def test_ssh_connection(host: str) -> str:
         raise Exception(f"SSH config for host '{host}' does not specify a username.")
 
     # Execute the SSH command to test the connection.
-    output = run_command(
+    output = await run_command(
         [
             "ssh",
             "-o",
@@ -265,7 +265,7 @@ async def test_ssh_connection_route(host_alias: str, request: Request):
     It verifies that the 'whoami' command output matches the configured username.
     """
     try:
-        username = test_ssh_connection(host_alias)
+        username = await test_ssh_connection(host_alias)
         return JSONResponse(
             content={
                 "detail": f"SSH connection test successful for host '{host_alias}'.",
@@ -293,7 +293,7 @@ async def ssh_key(request: Request):
     return {"key": key}
 
 
-def get_trusted_fingerprint(host_alias: str) -> str:
+async def get_trusted_fingerprint(host_alias: str) -> str:
     """
     Looks up the SSH alias in the config and retrieves the fingerprint
     using the actual HostName.
@@ -322,7 +322,7 @@ def get_trusted_fingerprint(host_alias: str) -> str:
         )
 
     # Now use the real hostname to look up the fingerprint
-    output = run_command(
+    output = await run_command(
         ["ssh-keygen", "-F", real_host, "-f", known_hosts_path],
         allow_failure=False,
     )
@@ -338,7 +338,7 @@ def get_trusted_fingerprint(host_alias: str) -> str:
 @router.get("/fingerprint/{host_alias}", response_class=JSONResponse)
 async def get_host_fingerprint(host_alias: str, request: Request):
     try:
-        fingerprint = get_trusted_fingerprint(host_alias)
+        fingerprint = await get_trusted_fingerprint(host_alias)
         return {"host": host_alias, "fingerprint": fingerprint}
     except Exception as e:
         return JSONResponse(status_code=404, content={"error": str(e)})
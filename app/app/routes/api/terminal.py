@@ -1,8 +1,7 @@
 # app/routes/terminal.py
 import os
-import pty
 import asyncio
-import select
+import codecs
 from fastapi import (
     APIRouter,
     WebSocket,
@@ -12,54 +11,155 @@ from fastapi import (
     Path,
 )
 from fastapi.responses import JSONResponse
-import fcntl
-import termios
-import struct
 import json
-import signal
-import errno
 import logging
-import subprocess
 from typing import Optional
 from app.lib.tmux import (
-    get_tmux_pane_cwd_path,
-    inject_command_to_tmux,
-    get_windows,
+    get_session_cwd,
+    get_window_state,
     set_window_active,
     create_new_window,
     delete_window,
     rename_window,
     TMUX_SESSION_DEFAULT,
+    TmuxError,
+)
+from app.lib.terminal_session import (
+    TerminalClient,
+    OutputWindow,
+    sessions as terminal_sessions,
+)
+from app.broadcast import broadcast, subscribe, unsubscribe, Subscriber
+from app.models.events import (
+    OpenAppEvent,
+    Event,
+    LogoutEvent,
+    TmuxCwdChangedEvent,
 )
-from app.broadcast import broadcast, subscribe, unsubscribe
-from app.models.events import OpenAppEvent, Event, LogoutEvent, TmuxSessionChangedEvent
 import gibberish
 
 log = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/terminal", tags=["terminal"])
 gib = gibberish.Gibberish()
 
-
-async def watch_for_logout(queue: asyncio.Queue, websocket: WebSocket):
+# Clients that ask for "binary" in their initial message get terminal output
+# as binary websocket frames: a one byte frame type followed by the payload.
+# Control messages (cwd, exit) stay JSON text frames.
+#
+# Binary clients may also ask for "flow_control", and then acknowledge the
+# output they have processed with {"type": "ack", "bytes": <total so far>}.
+#
+# The server first replies with
+# {"type": "session", "id": ..., "resumed": ..., "read_only": ...}.
+# A client that reconnects with that id in its initial message ("session")
+# reattaches to the same command as its owner, and gets its recent output in
+# a single FRAME_REPLAY frame (a plain data message for JSON clients). If the
+# session is gone, the socket is closed with CLOSE_NO_SESSION rather than
+# starting the command again.
+#
+# Read-only viewers either name the session to watch ("view": <id>), or ask
+# to "share" a running session with the same command instead of starting a
+# new one. Their input and resizes are ignored. An owner that another client
+# takes the session over from is sent a new "session" message, with
+# "read_only": true. Sessions live in one worker, so with APP_WORKERS > 1 a
+# client only finds the sessions of the worker it happens to connect to.
+FRAME_OUTPUT = b"\x00"
+FRAME_REPLAY = b"\x01"
+# Close code for a "view" or "session" that doesn't exist:
+CLOSE_NO_SESSION = 4004
+
+
+async def watch_events(queue: Subscriber, websocket: WebSocket):
+    """Close the websocket on logout, and pass on working directory changes."""
     try:
         while True:
-            event = await queue.get()
+            message = await queue.get()
+            event = message.event
             if isinstance(event, LogoutEvent):
                 log.info("LogoutEvent received, closing terminal websocket.")
                 await websocket.close(code=4001)  # Use custom close code
                 break
+            elif isinstance(event, TmuxCwdChangedEvent):
+                if event.session == TMUX_SESSION_DEFAULT:
+                    await websocket.send_text(
+                        json.dumps({"type": "cwd", "path": event.path})
+                    )
     except Exception as e:
-        log.warning(f"watch_for_logout error: {e}")
+        log.warning(f"watch_events error: {e}")
+
+
+class WebSocketTerminalClient(TerminalClient):
+    def __init__(
+        self,
+        websocket: WebSocket,
+        binary: bool,
+        flow_control: bool,
+        read_only: bool,
+    ):
+        self.websocket = websocket
+        self.binary = binary
+        self.read_only = read_only
+        self.window = OutputWindow() if binary and flow_control else None
+        # Binary frames are the same for every binary client. Text frames
+        # depend on each client's decoder state:
+        self.encoding = "binary" if binary else None
+        # Multibyte characters may be split across reads:
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def encode_output(self, data: bytes, frame_type: bytes = FRAME_OUTPUT):
+        if self.binary:
+            return frame_type + data
+        return json.dumps({"type": "data", "data": self.decoder.decode(data)})
+
+    async def send_frame(self, frame, size: int):
+        if self.binary:
+            await self.websocket.send_bytes(frame)
+        else:
+            await self.websocket.send_text(frame)
+        if self.window is not None:
+            self.window.on_sent(size)
+
+    async def send_replay(self, data: bytes):
+        await self.send_frame(self.encode_output(data, FRAME_REPLAY), len(data))
+
+    async def send_exit(self, exit_code: int):
+        try:
+            await self.websocket.send_text(
+                json.dumps({"type": "exit", "exitCode": exit_code})
+            )
+        except Exception:
+            pass
+        await self.websocket.close()
+
+    async def close(self):
+        await self.websocket.close()
+
+    async def send_read_only(self, session_id: str):
+        await self.websocket.send_text(
+            json.dumps(
+                {
+                    "type": "session",
+                    "id": session_id,
+                    "resumed": True,
+                    "read_only": True,
+                }
+            )
+        )
 
 
 @router.websocket("/ws")
 async def terminal_ws(websocket: WebSocket):
     await websocket.accept()
-    event_queue = await subscribe()
-    logout_watcher = asyncio.create_task(watch_for_logout(event_queue, websocket))
-
-    initial_command_received = False
+    event_queue = await subscribe(["logout", "tmux_cwd_changed"])
+    event_watcher = asyncio.create_task(watch_events(event_queue, websocket))
+
+    session = None
+    client = None
+    # Keep the session for a reconnect, unless the client closed the socket
+    # on purpose or the command is done:
+    keep_session = False
     try:
+        initial_command_received = False
         while not initial_command_received:
             msg = await websocket.receive_text()
             try:
@@ -69,185 +169,111 @@ async def terminal_ws(websocket: WebSocket):
 
             if "command" in init_data:
                 command = init_data["command"]
+                view = init_data.get("view")
+                resume = init_data.get("session")
+                share = bool(init_data.get("share"))
+                client = WebSocketTerminalClient(
+                    websocket,
+                    binary=bool(init_data.get("binary")),
+                    flow_control=bool(init_data.get("flow_control")),
+                    read_only=bool(view or share),
+                )
                 initial_command_received = True
                 log.info(f"Teminal command request received: {command}")
             else:
                 continue
-    except WebSocketDisconnect:
-        return
-    except Exception as e:
-        print(f"Error waiting for initial command: {e}")
-        return
-
-    master_fd, slave_fd = pty.openpty()
-    pid = os.fork()
-
-    if pid == 0:
-        os.setsid()
-        os.dup2(slave_fd, 0)
-        os.dup2(slave_fd, 1)
-        os.dup2(slave_fd, 2)
-        os.close(slave_fd)
-        env = {
-            "TERM": "xterm-256color",
-            "PATH": "/usr/bin:/bin",
-            "HOME": os.environ.get("HOME", "/tmp"),
-        }
-        os.execvpe("/bin/bash", ["bash", "-i", "-c", command], env)
-    else:
-        if not hasattr(terminal_ws, "_reaper_started"):
-            terminal_ws._reaper_started = True
-            asyncio.create_task(reap_children())
-
-        pty_done = asyncio.Event()
-
-        async def wait_for_exit():
-            try:
-                _, status = await asyncio.to_thread(os.waitpid, pid, 0)
-                exit_code = os.WEXITSTATUS(status)
-                log.info(f"Terminal command exited with code: {exit_code}")
-
-                try:
-                    os.close(slave_fd)  # Close the slave side after the child exits
-                except Exception:
-                    pass
-
-                # Wait for PTY reader to finish draining
-                await pty_done.wait()
-
-                try:
-                    await websocket.send_text(
-                        json.dumps({"type": "exit", "exitCode": exit_code})
-                    )
-                except Exception:
-                    pass
 
-                await websocket.close()
-            except Exception as ex:
-                print(f"Error waiting for process exit: {ex}")
+        if view or resume:
+            # Never start the command again for a session that is gone (it
+            # expired, the server restarted, or it lives in another worker):
+            session = terminal_sessions.get(view or resume)
+            if session is None or (resume and session.command != command):
+                session = None
+                await websocket.close(code=CLOSE_NO_SESSION)
+                return
+            resumed = True
+        else:
+            session = terminal_sessions.find(command) if share else None
+            resumed = session is not None
+            if not resumed:
+                client.read_only = False
+                session = terminal_sessions.create(command)
+        await websocket.send_text(
+            json.dumps(
+                {
+                    "type": "session",
+                    "id": session.id,
+                    "resumed": resumed,
+                    "read_only": client.read_only,
+                }
+            )
+        )
+        await terminal_sessions.attach(session, client)
 
-        wait_task = asyncio.create_task(wait_for_exit())
+        try:
+            cwd = await get_session_cwd(TMUX_SESSION_DEFAULT)
+            if cwd:
+                await websocket.send_text(json.dumps({"type": "cwd", "path": cwd}))
+        except Exception:
+            pass
 
-        async def read_pty():
+        while True:
+            msg = await websocket.receive_text()
             try:
-                while True:
-                    await asyncio.sleep(0.01)
-                    if select.select([master_fd], [], [], 0)[0]:
-                        try:
-                            data = os.read(master_fd, 1024)
-                            if not data:
-                                break  # PTY closed (EOF)
-                            await websocket.send_text(
-                                json.dumps(
-                                    {
-                                        "type": "data",
-                                        "data": data.decode(errors="ignore"),
-                                    }
-                                )
-                            )
-                        except OSError:
-                            break
-            except Exception as ex:
-                print(f"Error reading from PTY: {ex}")
-            finally:
-                pty_done.set()
-
-        pty_task = asyncio.create_task(read_pty())
-
-        # ─── start a background task to watch /proc/<pane-pid>/cwd ───
-        async def watch_cwd():
-            last = None
-            # on connect, immediately try to send the current cwd
-            path_link = get_tmux_pane_cwd_path(TMUX_SESSION_DEFAULT)
-            if path_link:
-                try:
-                    dest = os.readlink(path_link)
-                    last = dest
-                    await websocket.send_text(json.dumps({"type": "cwd", "path": dest}))
-                except Exception:
+                parsed = json.loads(msg)
+                msg_type = parsed.get("type")
+                if msg_type in ("resize", "input") and client.read_only:
                     pass
-            # then poll once a second, sending only on change
-            while True:
-                await asyncio.sleep(1)
-                path_link = get_tmux_pane_cwd_path(TMUX_SESSION_DEFAULT)
-                if not path_link:
-                    continue
-                try:
-                    dest = os.readlink(path_link)
-                except Exception:
-                    continue
-                if dest != last:
-                    last = dest
-                    try:
-                        await websocket.send_text(
-                            json.dumps({"type": "cwd", "path": dest})
-                        )
-                    except Exception:
-                        break
-
-        cwd_task = asyncio.create_task(watch_cwd())
-
-        try:
-            while True:
-                msg = await websocket.receive_text()
-                try:
-                    parsed = json.loads(msg)
-                    msg_type = parsed.get("type")
-                    if msg_type == "resize":
-                        cols = parsed.get("cols")
-                        rows = parsed.get("rows")
-                        size = struct.pack("HHHH", rows, cols, 0, 0)
-                        fcntl.ioctl(master_fd, termios.TIOCSWINSZ, size)
-                    elif msg_type == "input":
-                        # User input sent from client.
-                        user_input = parsed.get("data", "")
-                        os.write(master_fd, user_input.encode())
-                    else:
-                        # If an unrecognized JSON message is received, ignore or handle appropriately.
-                        pass
-                except (json.JSONDecodeError, AttributeError):
-                    # In case a non-JSON message slips through.
-                    os.write(master_fd, msg.encode())
-        except WebSocketDisconnect:
-            print("WebSocket disconnected. Cleaning up...")
-        except Exception as e:
-            print(f"Unexpected error: {e}")
-        finally:
-            logout_watcher.cancel()
-            await asyncio.gather(logout_watcher, return_exceptions=True)
-            unsubscribe(event_queue)
-            try:
-                os.killpg(pid, signal.SIGTERM)
-                await asyncio.sleep(0.1)
-                os.killpg(pid, signal.SIGKILL)
-            except ProcessLookupError:
-                pass
-            try:
-                os.close(master_fd)
-            except OSError:
-                pass
-            pty_task.cancel()
-            wait_task.cancel()
-            cwd_task.cancel()
-            await asyncio.gather(pty_task, wait_task, return_exceptions=True)
-
-
-async def reap_children():
-    while True:
-        try:
-            pid, _ = await asyncio.to_thread(os.waitpid, -1, os.WNOHANG)
-            if pid == 0:
-                await asyncio.sleep(0.1)
-            else:
-                print(f"🧼 Reaped zombie child: PID {pid}")
-        except ChildProcessError:
-            # No children to wait for *right now*, just wait and try again later
-            await asyncio.sleep(0.5)
-        except OSError as e:
-            if e.errno == errno.ECHILD:
-                await asyncio.sleep(0.5)
+                elif msg_type == "resize":
+                    session.resize(parsed.get("rows"), parsed.get("cols"))
+                elif msg_type == "ack":
+                    acked = parsed.get("bytes")
+                    if client.window is not None and isinstance(acked, int):
+                        client.window.ack(acked)
+                elif msg_type == "input":
+                    # User input sent from client.
+                    session.write(parsed.get("data", "").encode())
+                else:
+                    # If an unrecognized JSON message is received, ignore or handle appropriately.
+                    pass
+            except (json.JSONDecodeError, AttributeError):
+                # In case a non-JSON message slips through.
+                if not client.read_only:
+                    session.write(msg.encode())
+    except WebSocketDisconnect as e:
+        log.info("WebSocket disconnected. Cleaning up...")
+        keep_session = e.code != 1000 and not event_watcher.done()
+    except Exception as e:
+        log.exception(f"Unexpected error: {e}")
+    finally:
+        event_watcher.cancel()
+        await asyncio.gather(event_watcher, return_exceptions=True)
+        unsubscribe(event_queue)
+        if session is not None:
+            if session.owner is client and not keep_session:
+                # The owner ended the session:
+                await terminal_sessions.close(session)
             else:
-                raise
+                # Also starts the expiry of a session the client never got
+                # attached to:
+                await terminal_sessions.detach(session, client)
+        if client is not None and client.window is not None and client.window.pauses:
+            log.info(f"Terminal output paused {client.window.pauses} times")
+
+
+@router.get("/sessions")
+async def list_terminal_sessions():
+    """Running terminal sessions in this worker, for viewers to attach to."""
+    return [
+        {
+            "id": session.id,
+            "command": session.command,
+            "owner": session.owner is not None,
+            "viewers": len(session.clients) - (session.owner is not None),
+            "finished": session.finished.is_set(),
+        }
+        for session in terminal_sessions.sessions.values()
+    ]
 
 
 @router.post("/{session_name}/window")
@@ -259,14 +285,11 @@ async def create_tmux_window(
     try:
         if not window_name or not len(window_name):
             window_name = gib.generate_word()
-        create_new_window(
+        await create_new_window(
             session_name=session_name,
             window_name=window_name,
             active=active,
         )
-        await broadcast(
-            TmuxSessionChangedEvent(session=session_name, **get_windows(session_name))
-        )
         if active:
             await broadcast(OpenAppEvent(page="workstation"))
         return JSONResponse(
@@ -275,16 +298,16 @@ async def create_tmux_window(
                 "message": f"Window '{window_name}' created and command injected",
             }
         )
+    except TmuxError as e:
+        raise HTTPException(status_code=500, detail=f"tmux error: {e}")
     except RuntimeError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    except subprocess.CalledProcessError as e:
-        raise HTTPException(status_code=500, detail=f"tmux error: {e}")
 
 
 @router.get("/{session_name}/window")
 async def get_tmux_windows(session_name: str = Path(...)):
     try:
-        return {"session": session_name, **get_windows(session_name)}
+        return {"session": session_name, **await get_window_state(session_name)}
     except RuntimeError:
         return {"session": session_name, "windows": [], "active": None}
 
@@ -294,15 +317,11 @@ async def set_active_window(
     session_name: str = Path(...),
     index: int = Query(..., description="Index of the window to activate"),
 ):
-    success = set_window_active(session_name, index)
+    success = await set_window_active(session_name, index)
     if not success:
         raise HTTPException(status_code=404, detail="Session or window not found")
 
-    # Emit updated state after switching
-    state = get_windows(session_name)
-    await broadcast(TmuxSessionChangedEvent(session=session_name, **state))
-
-    return {"session": session_name, "active": state["active"]}
+    return {"session": session_name, "active": index}
 
 
 @router.delete("/{session_name}/window/")
@@ -310,7 +329,7 @@ async def delete_tmux_window(
     session_name: str = Path(...),
     window_index: int = Query(..., description="Index of the window to delete"),
 ):
-    success = delete_window(session_name, window_index)
+    success = await delete_window(session_name, window_index)
     if not success:
         raise HTTPException(status_code=404, detail="Session or window not found")
 
@@ -327,7 +346,7 @@ async def rename_tmux_window(
     new_name: str = Query(..., description="New name for the window"),
 ):
     new_name = new_name.strip()
-    success = rename_window(session_name, index, new_name)
+    success = await rename_window(session_name, index, new_name)
     if not success:
         raise HTTPException(status_code=404, detail="Session or window not found")
 
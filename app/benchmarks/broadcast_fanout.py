@@ -0,0 +1,61 @@
+"""
+Microbenchmark: fan one event out to many SSE subscribers.
+
+Compares serializing the event once per subscriber (the old behaviour)
+against the shared Message frame, with and without pydantic validation.
+
+Run from the app directory:
+
+    python -m benchmarks.broadcast_fanout [SUBSCRIBERS] [EVENTS]
+"""
+
+import asyncio
+import sys
+import time
+
+from app import broadcast
+from app.models.events import InstanceStatusEvent
+
+
+def make_event(i: int, construct: bool):
+    fields = {"context": "default", "project": f"whoami_{i}", "status": "running"}
+    if construct:
+        return InstanceStatusEvent.model_construct(**fields)
+    return InstanceStatusEvent(**fields)
+
+
+async def drain(subscribers, per_subscriber_json: bool):
+    for q in subscribers:
+        while q.qsize():
+            message = await q.get()
+            if per_subscriber_json:
+                event = message.event
+                f"event: {event.type}\ndata: {event.model_dump_json()}\n\n".encode()
+            else:
+                message.frame
+
+
+async def run(label: str, n_events: int, construct: bool, per_subscriber_json: bool):
+    subscribers = list(broadcast.subscribers)
+    start = time.perf_counter()
+    for i in range(n_events):
+        await broadcast.broadcast(make_event(i, construct))
+        await drain(subscribers, per_subscriber_json)
+    elapsed = time.perf_counter() - start
+    per_event = elapsed / n_events * 1e3
+    print(f"{label:<40} {per_event:8.3f} ms/event")
+
+
+async def main(n_subscribers: int, n_events: int):
+    for _ in range(n_subscribers):
+        await broadcast.subscribe()
+    print(f"{n_subscribers} subscribers, {n_events} events")
+    await run("serialize per subscriber", n_events, False, True)
+    await run("shared frame", n_events, False, False)
+    await run("shared frame, model_construct", n_events, True, False)
+
+
+if __name__ == "__main__":
+    n_subscribers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    n_events = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    asyncio.run(main(n_subscribers, n_events))
@@ -46,10 +46,17 @@ mkdir -p /var/run/sshd
 # Create directory for the sqlite database used by the app
 mkdir -p /root/dry_agent/database
 
+# Workers share the first token written after startup, so remove the old one
+rm -f /data/token/current_token.txt
+
 /usr/sbin/sshd
 
+APP_WORKERS=${APP_WORKERS:-1}
+export APP_WORKERS
+
 exec python -m uvicorn app.main:app \
   --host 0.0.0.0 --port 8001 \
+  --workers ${APP_WORKERS} \
   --ssl-certfile /certs/dry-agent_App.crt \
   --ssl-keyfile   /certs/dry-agent_App.key \
   --ssl-ca-certs  /certs/dry-agent-root.crt \
@@ -0,0 +1,53 @@
+from app.broadcast import Message, Subscriber
+from app.models.events import TmuxCwdChangedEvent, TmuxSessionChangedEvent
+
+
+def windows_event(session: str, active: int) -> Message:
+    return Message(
+        TmuxSessionChangedEvent.model_construct(
+            session=session, windows=[{"index": active, "name": "bash"}], active=active
+        )
+    )
+
+
+def pending(q: Subscriber):
+    return [
+        (m.type, m.event.session, getattr(m.event, "active", None)) for m in q.messages
+    ]
+
+
+def test_coalesces_per_session():
+    q = Subscriber()
+    q.put(windows_event("work", 1))
+    for active in range(5):
+        q.put(windows_event("other", active))
+    q.put(windows_event("work", 2))
+    q.put(windows_event("other", 9))
+
+    assert pending(q) == [
+        ("tmux_session_changed", "work", 2),
+        ("tmux_session_changed", "other", 9),
+    ]
+
+
+def test_coalesces_per_event_type():
+    q = Subscriber()
+    q.put(windows_event("work", 1))
+    q.put(Message(TmuxCwdChangedEvent(session="work", path="/tmp")))
+    q.put(windows_event("work", 2))
+    q.put(Message(TmuxCwdChangedEvent(session="other", path="/")))
+
+    assert [(m.type, m.event.session) for m in q.messages] == [
+        ("tmux_cwd_changed", "work"),
+        ("tmux_session_changed", "work"),
+        ("tmux_cwd_changed", "other"),
+    ]
+
+
+def test_full_queue_keeps_every_session():
+    q = Subscriber(maxsize=2)
+    q.put(windows_event("work", 1))
+    q.put(windows_event("other", 1))
+    q.put(windows_event("third", 1))
+
+    assert {m.event.session for m in q.messages} == {"work", "other", "third"}
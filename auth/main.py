@@ -76,6 +76,15 @@ class TokenFileEventHandler(FileSystemEventHandler):
         if os.path.abspath(event.src_path) == os.path.abspath(TOKEN_FILE):
             self.loop.call_soon_threadsafe(load_token_from_file)
 
+    def on_created(self, event):
+        self.on_modified(event)
+
+    def on_moved(self, event):
+        # The app replaces the token file atomically, by renaming a new one
+        # over it:
+        if os.path.abspath(event.dest_path) == os.path.abspath(TOKEN_FILE):
+            self.loop.call_soon_threadsafe(load_token_from_file)
+
 
 def load_token_from_file():
     global current_token
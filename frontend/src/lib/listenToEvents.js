@@ -7,7 +7,8 @@ import {
   conversationId,
   conversationTitle,
   terminalSessionState,
-  eventSourceConnected
+  eventSourceConnected,
+  instanceStatusEvent
 } from "$lib/stores";
 import { goto } from "$app/navigation";
 import { get } from "svelte/store";
@@ -133,6 +134,12 @@ export function listenToServerEvents() {
       terminalSessionState.set(payload);
     });
 
+    source.addEventListener("instance_status", (event) => {
+      /** @type {{ context: string, project: string, status: string }} */
+      const payload = JSON.parse(event.data);
+      instanceStatusEvent.set(payload);
+    });
+
     source.onerror = (err) => {
       console.error("SSE connection lost", err);
     };
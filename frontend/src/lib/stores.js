@@ -20,6 +20,7 @@ export const terminalFontSize = persisted('terminalFontSize', 14);
 
 export const terminalSessionState = writable(null);
 export const eventSourceConnected = writable(false);
+export const instanceStatusEvent = writable(null);
 
 /**
  * Create a writable store that persists to localStorage under `key`.
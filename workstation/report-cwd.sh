@@ -0,0 +1,15 @@
+# Sourced by interactive bash shells (from /etc/bash.bashrc).
+# Tells the app when the working directory of a tmux pane changes, so that
+# it doesn't have to poll tmux for it.
+__dry_agent_report_cwd() {
+    if [ -n "$TMUX_PANE" ] && [ "$PWD" != "$__dry_agent_cwd" ] && [ -S /run/tmux-event.sock ]; then
+        __dry_agent_cwd=$PWD
+        printf 'cwd\t%s\t%s\t%s\n' \
+            "$(tmux display-message -p -t "$TMUX_PANE" '#S')" "$TMUX_PANE" "$PWD" |
+            nc -N -U /run/tmux-event.sock >/dev/null 2>&1
+    fi
+}
+case ";${PROMPT_COMMAND};" in
+    *";__dry_agent_report_cwd;"*) ;;
+    *) PROMPT_COMMAND="__dry_agent_report_cwd${PROMPT_COMMAND:+;$PROMPT_COMMAND}" ;;
+esac